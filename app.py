@@ -1,163 +1,212 @@
-from flask import Flask, render_template, request, jsonify
-import numpy as np
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import ast
-import pickle
-import os
-
-app = Flask(__name__)
-
-# Global variables to store the model and data
-movies_df = None
-similarity_matrix = None
-cv = None
-
-def load_and_process_data():
-    """Load and process the movie data"""
-    global movies_df, similarity_matrix, cv
-    
-    print("Loading movie datasets...")
-    
-    # Load the datasets
-    movies = pd.read_csv(r"C:\Users\akshi\OneDrive\Desktop\tmdb_5000_movies.csv")
-    credits = pd.read_csv(r"C:\Users\akshi\OneDrive\Desktop\tmdb_5000_credits.csv")
-    
-    print(f"Movies dataset: {movies.shape}")
-    print(f"Credits dataset: {credits.shape}")
-    
-    # Merge datasets
-    movies = movies.merge(credits, on='title')
-    print(f"Merged dataset: {movies.shape}")
-    
-    # Select relevant columns
-    movies = movies[['genres', 'title', 'overview', 'keywords', 'id', 'cast', 'crew']]
-    
-    # Handle missing values
-    movies['overview'] = movies['overview'].fillna("")
-    movies.dropna(inplace=True)
-    print(f"Final dataset: {movies.shape}")
-    
-    # Function to convert string lists to actual lists
-    def convert(obj):
-        try:
-            l = []
-            for i in ast.literal_eval(obj):
-                l.append(i['name'])
-            return l
-        except:
-            return []
-
-    def fetch_director(obj):
-        try:
-            l = []
-            for i in ast.literal_eval(obj):
-                if i['job'] == 'Director':
-                    l.append(i['name'])
-                    break
-            return l
-        except:
-            return []
-
-    print("Processing movie features...")
-    
-    # Apply conversions
-    movies['genres'] = movies['genres'].apply(convert)
-    movies['keywords'] = movies['keywords'].apply(convert)
-    movies['cast'] = movies['cast'].apply(convert)
-    movies['crew'] = movies['crew'].apply(fetch_director)
-    
-    # Convert overview to list of words
-    movies['overview'] = movies['overview'].apply(lambda x: x.split())
-    
-    # Clean up text (remove spaces)
-    movies['genres'] = movies['genres'].apply(lambda x: [i.replace(" ", "") for i in x] if isinstance(x, list) else x)
-    movies['keywords'] = movies['keywords'].apply(lambda x: [i.replace(" ", "") for i in x] if isinstance(x, list) else x)
-    movies['overview'] = movies['overview'].apply(lambda x: [i.replace(" ", "") for i in x] if isinstance(x, list) else x)
-    
-    # Create tags
-    movies['tags'] = movies['overview'] + movies['genres'] + movies['keywords'] + movies['cast'] + movies['crew']
-    
-    # Create final dataframe
-    movies_df = movies[['id', 'title', 'tags']].copy()
-    movies_df['tags'] = movies_df['tags'].apply(lambda x: ' '.join(x))
-    
-    print(f"Processed {len(movies_df)} movies")
-    
-    # Create vectors
-    print("Creating movie vectors...")
-    cv = CountVectorizer(max_features=5000, stop_words='english')
-    vectors = cv.fit_transform(movies_df['tags']).toarray()
-    
-    # Calculate similarity
-    print("Calculating similarities...")
-    similarity_matrix = cosine_similarity(vectors)
-    
-    print("Data processing complete!")
-
-def recommend_movies(movie_title):
-    """Get movie recommendations"""
-    try:
-        movie_index = movies_df[movies_df['title'] == movie_title].index[0]
-        distances = similarity_matrix[movie_index]
-        movies_list = sorted(list(enumerate(distances)), reverse=True, key=lambda x: x[1])[1:6]
-        
-        recommended_movies = []
-        for i in movies_list:
-            recommended_movies.append(movies_df.iloc[i[0]].title)
-        
-        return recommended_movies
-    except:
-        return []
-
-def search_movies(query):
-    """Search for movies by title"""
-    if not query:
-        return []
-    
-    query = query.lower()
-    matching_movies = []
-    
-    for title in movies_df['title']:
-        if query in title.lower():
-            matching_movies.append(title)
-            if len(matching_movies) >= 10:  # Limit to 10 results
-                break
-    
-    return matching_movies
-
-@app.route('/')
-def home():
-    """Home page"""
-    return render_template('index.html')
-
-@app.route('/api/search')
-def search():
-    """API endpoint for movie search"""
-    query = request.args.get('q', '')
-    results = search_movies(query)
-    return jsonify(results)
-
-@app.route('/api/recommend')
-def recommend():
-    """API endpoint for movie recommendations"""
-    movie_title = request.args.get('movie', '')
-    recommendations = recommend_movies(movie_title)
-    return jsonify(recommendations)
-
-@app.route('/api/movies')
-def get_movies():
-    """API endpoint to get all movies"""
-    movies_list = movies_df['title'].tolist()
-    return jsonify(movies_list)
-
-if __name__ == '__main__':
-    # Load data when starting the app
-    load_and_process_data()
-    
-    # Create templates directory if it doesn't exist
-    os.makedirs('templates', exist_ok=True)
-    
-    print("Starting Flask web server...")
+from flask import Flask, render_template, request, jsonify
+import numpy as np
+import pandas as pd
+from pipeline import run_pipeline, text_query
+from search import SearchIndex, TitleIndex, is_movie_reference
+from filters import CatalogFilter, parse_filter_args
+import pickle
+import os
+
+app = Flask(__name__)
+
+# Global variables to store the model and data
+movies_df = None
+similarity_engine = None
+title_index = None
+search_index = None
+catalog_filter = None
+movie_titles = None
+cv = None
+
+# Limits for the batch recommendation endpoint
+MAX_K = 100
+MAX_BATCH_SIZE = 10000
+
+# Longest description accepted by the free-text recommendation endpoint
+MAX_TEXT_LENGTH = 5000
+
+def load_and_process_data():
+    """Load and process the movie data"""
+    global movies_df, similarity_engine, title_index, search_index, catalog_filter, movie_titles, cv
+    
+    print("Loading movie datasets...")
+    
+    # Run the pipeline, reusing any stages cached by an earlier run
+    movies_df, cv, similarity_engine, _ = run_pipeline()
+    
+    # Index titles and ids by row position for constant-time lookups
+    title_index = TitleIndex(movies_df['title'], movies_df['id'])
+    movie_titles = movies_df['title'].to_numpy()
+    search_index = SearchIndex(movies_df['title'], movies_df['popularity'])
+    catalog_filter = CatalogFilter(movies_df['genres'], movies_df['popularity'], movies_df['vote_count'])
+    
+    print(f"Processed {len(movies_df)} movies")
+    
+    print("Data processing complete!")
+
+def recommend_movies(movie_title, movie_id=None, include=(), exclude=(), min_votes=0, popularity_weight=0.0):
+    """Get movie recommendations, optionally filtered and popularity-blended"""
+    try:
+        movie_index = title_index.lookup(movie_title, movie_id)
+        if movie_index is None:
+            return []
+        allowed = catalog_filter.mask(include, exclude, min_votes)
+        movies_list, _ = similarity_engine.neighbors(
+            movie_index, 5, allowed, catalog_filter.popularity, popularity_weight
+        )
+        
+        return movie_titles[movies_list].tolist()
+    except:
+        return []
+
+def resolve_movie(movie):
+    """Row position for a title or a TMDB id, or None if unknown"""
+    if isinstance(movie, int):
+        return title_index.lookup(movie_id=movie)
+    return title_index.lookup(movie)
+
+def recommend_movies_batch(movies, k=5):
+    """Get recommendations for many movies with one engine call
+
+    Each entry is a title or a TMDB id; unknown movies get an empty list.
+    """
+    positions = [resolve_movie(movie) for movie in movies]
+    neighbor_ids, _ = similarity_engine.neighbors_batch([p for p in positions if p is not None], k)
+    
+    found = iter(movie_titles[neighbor_ids].tolist())
+    return [next(found) if p is not None else [] for p in positions]
+
+def recommend_for_text(text, k=10):
+    """Get the movies best matching a free-text description, with their scores"""
+    movies_list, scores = similarity_engine.text_neighbors(text_query(cv, text), k)
+    return [
+        {'id': int(movie_id), 'title': title, 'score': round(float(score), 4)}
+        for movie_id, title, score in zip(movies_df['id'].to_numpy()[movies_list], movie_titles[movies_list], scores)
+    ]
+
+def recommend_for_profile(movies, weights=None, k=10):
+    """Get recommendations for a whole watch history
+
+    Seeds are titles or TMDB ids with optional weights; unknown seeds are
+    ignored and the seeds themselves are never recommended.
+    """
+    weights = [1.0] * len(movies) if weights is None else weights
+    seeds = [(resolve_movie(movie), weight) for movie, weight in zip(movies, weights)]
+    seeds = [(position, weight) for position, weight in seeds if position is not None]
+    if not seeds:
+        return []
+    
+    positions, weights = zip(*seeds)
+    movies_list, _ = similarity_engine.profile(positions, weights, k)
+    return movie_titles[movies_list].tolist()
+
+def search_movies(query, fuzzy=0):
+    """Search for movies by title, best matches first"""
+    return search_index.search(query, fuzzy=fuzzy)
+
+@app.route('/')
+def home():
+    """Home page"""
+    return render_template('index.html')
+
+@app.route('/api/search')
+def search():
+    """API endpoint for movie search"""
+    query = request.args.get('q', '')
+    fuzzy = request.args.get('fuzzy', 0, type=int)
+    results = search_movies(query, fuzzy)
+    return jsonify(results)
+
+@app.route('/api/recommend')
+def recommend():
+    """API endpoint for movie recommendations"""
+    movie_title = request.args.get('movie', '')
+    movie_id = request.args.get('id', type=int)
+    try:
+        filters = parse_filter_args(request.args, catalog_filter)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    recommendations = recommend_movies(movie_title, movie_id, **filters)
+    return jsonify(recommendations)
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """API endpoint for recommendations for many movies at once"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'request body must be a JSON object'}), 400
+    movies = payload.get('movies', [])
+    k = payload.get('k', 5)
+    
+    if (not isinstance(movies, list) or len(movies) > MAX_BATCH_SIZE
+            or not all(is_movie_reference(movie) for movie in movies)):
+        return jsonify({'error': f'movies must be a list of at most {MAX_BATCH_SIZE} titles or ids'}), 400
+    if not isinstance(k, int) or not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be an integer between 1 and {MAX_K}'}), 400
+    
+    recommendations = recommend_movies_batch(movies, k)
+    return jsonify([
+        {'movie': movie, 'recommendations': recs}
+        for movie, recs in zip(movies, recommendations)
+    ])
+
+@app.route('/api/recommend/profile', methods=['POST'])
+def recommend_profile():
+    """API endpoint for recommendations based on a list of watched movies"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'request body must be a JSON object'}), 400
+    history = payload.get('movies', [])
+    k = payload.get('k', 10)
+    
+    if not isinstance(history, list) or not 1 <= len(history) <= MAX_BATCH_SIZE:
+        return jsonify({'error': f'movies must be a list of 1 to {MAX_BATCH_SIZE} titles, ids or {{"movie", "weight"}} objects'}), 400
+    if not isinstance(k, int) or not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be an integer between 1 and {MAX_K}'}), 400
+    
+    movies, weights = [], []
+    for entry in history:
+        if isinstance(entry, dict):
+            entry, weight = entry.get('movie'), entry.get('weight', 1.0)
+        else:
+            weight = 1.0
+        if not is_movie_reference(entry):
+            return jsonify({'error': 'each movie must be a title, an id or a {"movie", "weight"} object'}), 400
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not np.isfinite(weight) or weight <= 0:
+            return jsonify({'error': 'weight must be a positive finite number'}), 400
+        movies.append(entry)
+        weights.append(weight)
+    
+    return jsonify(recommend_for_profile(movies, weights, k))
+
+@app.route('/api/recommend/text', methods=['POST'])
+def recommend_text():
+    """API endpoint for recommendations from a free-text description"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'request body must be a JSON object'}), 400
+    text = payload.get('text', '')
+    k = payload.get('k', 10)
+    
+    if not isinstance(text, str) or not text.strip() or len(text) > MAX_TEXT_LENGTH:
+        return jsonify({'error': f'text must be a non-empty string of at most {MAX_TEXT_LENGTH} characters'}), 400
+    if not isinstance(k, int) or not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be an integer between 1 and {MAX_K}'}), 400
+    
+    return jsonify(recommend_for_text(text, k))
+
+@app.route('/api/movies')
+def get_movies():
+    """API endpoint to get all movies"""
+    movies_list = movies_df['title'].tolist()
+    return jsonify(movies_list)
+
+if __name__ == '__main__':
+    # Load data when starting the app
+    load_and_process_data()
+    
+    # Create templates directory if it doesn't exist
+    os.makedirs('templates', exist_ok=True)
+    
+    print("Starting Flask web server...")
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,287 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app_production as service
+from metrics import observe_request
+
+# Threads running NumPy scoring; NumPy releases the GIL so they run in parallel
+SCORING_THREADS = int(os.environ.get('SCORING_THREADS', os.cpu_count() or 1))
+
+# Requests queued or running in the scoring pool before new ones get 503
+MAX_PENDING_REQUESTS = int(os.environ.get('MAX_PENDING_REQUESTS', SCORING_THREADS * 8))
+
+# Seconds a request may wait for the scoring pool before it gets 504
+REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', 5.0))
+
+executor = ThreadPoolExecutor(max_workers=SCORING_THREADS, thread_name_prefix='scoring')
+
+# Work submitted to the scoring pool and not finished yet; only changed on the event loop
+pending = 0
+
+# Cache misses being computed, keyed by cache and key, so identical requests share one computation
+inflight = {}
+
+
+class HTTPError(Exception):
+    """Error answered with a JSON body and the given status code"""
+
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+async def offload(function, *args):
+    """Run blocking work in the scoring pool with backpressure and a timeout
+
+    Raises HTTPError 503 when too much work is pending and 504 when the
+    result takes longer than REQUEST_TIMEOUT. A request that times out while
+    still queued is cancelled; one already running finishes in the
+    background and keeps counting as pending until it does.
+    """
+    global pending
+    if pending >= MAX_PENDING_REQUESTS:
+        raise HTTPError(503, 'server is busy, retry shortly', [(b'retry-after', b'1')])
+
+    loop = asyncio.get_running_loop()
+
+    def release(_):
+        global pending
+        pending -= 1
+
+    pending += 1
+    future = executor.submit(function, *args)
+    future.add_done_callback(lambda f: loop.call_soon_threadsafe(release, f))
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise HTTPError(504, f'request took longer than {REQUEST_TIMEOUT:g}s')
+
+
+def query_params(scope):
+    """Last value of each query string parameter"""
+    return {key: values[-1] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+
+
+def int_param(params, name, default):
+    """Integer query parameter, or 400 if it is not a number"""
+    try:
+        return int(params[name]) if name in params else default
+    except ValueError:
+        raise HTTPError(400, f'{name} must be an integer')
+
+
+async def cached(cache, key, compute):
+    """Cached payload for key, computing it in the scoring pool on a miss
+
+    Concurrent misses for the same key await one shared computation.
+    """
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    flight = (id(cache), key)
+
+    def finish(task):
+        inflight.pop(flight, None)
+        if not task.cancelled() and task.exception() is None:
+            cache.set(key, task.result())
+
+    task = inflight.get(flight)
+    if task is None:
+        task = inflight[flight] = asyncio.ensure_future(offload(compute))
+        task.add_done_callback(finish)
+    return await asyncio.shield(task)
+
+
+async def search(params, headers, state):
+    """Movie search, best matches first"""
+    query = params.get('q', '')
+    fuzzy = int_param(params, 'fuzzy', 0)
+    return await cached(
+        service.search_cache, (state.generation, query, fuzzy),
+        lambda: service.to_json(service.search_movies(query, fuzzy, state)),
+    ), []
+
+
+async def recommend(params, headers, state):
+    """Recommendations for a title or a TMDB id"""
+    movie_title = params.get('movie', '')
+    movie_id = int_param(params, 'id', None)
+    try:
+        filters = service.parse_filter_args(params, state.catalog_filter)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    return await cached(
+        service.recommend_cache, (state.generation, movie_title, movie_id, *filters.values()),
+        lambda: service.to_json(service.recommend_movies(movie_title, movie_id, **filters, state=state)),
+    ), []
+
+
+def accepts_gzip(header):
+    """Whether an Accept-Encoding header allows gzip, honouring q-values
+
+    An explicit `gzip` entry decides; otherwise `*` does. A q-value of 0 or
+    one that is not a number refuses the encoding, as in werkzeug's parsing
+    for the Flask app.
+    """
+    qualities = {}
+    for entry in header.decode('latin-1').split(','):
+        coding, *params = [part.strip() for part in entry.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+async def movies(params, headers, state):
+    """All movie titles, or one page of the catalog"""
+    if not any(name in params for name in ('cursor', 'limit', 'fields')):
+        if accepts_gzip(headers.get(b'accept-encoding', b'')):
+            return state.movies_payload_gzip, [(b'content-encoding', b'gzip')]
+        return state.movies_payload, []
+
+    limit = int_param(params, 'limit', service.DEFAULT_PAGE_SIZE)
+
+    def page():
+        try:
+            return service.to_json(service.movies_page(params.get('cursor'), limit, params.get('fields'), state))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        except LookupError as e:
+            raise HTTPError(410, str(e))
+
+    return await offload(page), []
+
+
+async def health(params, headers, state):
+    """Health check with the model loading state and the generation served"""
+    return service.to_json(service.health_payload(state)), []
+
+
+async def ready(params, headers, state):
+    """Readiness probe, failing until the model is serving"""
+    if state is None:
+        raise HTTPError(503, f'model is {service.model_state}')
+    return service.to_json({'ready': True, 'generation': state.generation}), []
+
+
+ROUTES = {
+    '/api/search': search,
+    '/api/recommend': recommend,
+    '/api/movies': movies,
+    '/health': health,
+    '/ready': ready,
+}
+
+
+def not_modified(headers, generation):
+    """ETag of the current generation if If-None-Match already names it"""
+    tags = [tag.strip().removeprefix('W/').strip('"') for tag in headers.get(b'if-none-match', b'').decode('latin-1').split(',')]
+    for etag in (generation, f'{generation}-gzip'):
+        if etag in tags or '*' in tags:
+            return etag
+    return None
+
+
+def cache_headers(etag):
+    """ETag and caching headers tying a response to the artifact generation"""
+    return [
+        (b'etag', f'"{etag}"'.encode()),
+        (b'cache-control', f'public, max-age={service.CACHE_MAX_AGE}'.encode()),
+        (b'vary', b'Accept-Encoding'),
+    ]
+
+
+async def handle(scope):
+    """Status, body and headers of the response to one HTTP request"""
+    path, method = scope['path'], scope['method']
+    route = ROUTES.get(path)
+    if route is None:
+        raise HTTPError(404, 'not found')
+    if method != 'GET':
+        raise HTTPError(405, 'method not allowed')
+
+    # Taken once, so a reload never changes the model in the middle of a request
+    state = service.model
+    is_api = path.startswith('/api/')
+    if is_api and state is None:
+        raise HTTPError(503, 'model is loading', [(b'retry-after', b'5')])
+
+    headers = dict(scope['headers'])
+    if is_api:
+        etag = not_modified(headers, state.generation)
+        if etag:
+            return 304, b'', cache_headers(etag)
+
+    body, extra = await route(query_params(scope), headers, state)
+    if is_api:
+        gzipped = (b'content-encoding', b'gzip') in extra
+        extra = extra + cache_headers(f'{state.generation}-gzip' if gzipped else state.generation)
+    return 200, body, [(b'content-type', b'application/json')] + extra
+
+
+async def lifespan(receive, send):
+    """Start loading and watching the model in background threads and shut the pool down on exit"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            service.start_loading()
+            service.start_watching()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def send_response(send, status, body, headers):
+    """Send a response whose body is bytes or a memory-mapped payload array, streamed in chunks"""
+    if isinstance(body, bytes):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+        return
+    headers = headers + [(b'content-length', str(len(body)).encode())]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    for chunk in service.payload_chunks(body):
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def app(scope, receive, send):
+    """ASGI application serving the read-only API routes"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    start = time.perf_counter()
+    try:
+        status, body, headers = await handle(scope)
+    except HTTPError as e:
+        status, body = e.status, service.to_json({'error': str(e)})
+        headers = [(b'content-type', b'application/json')] + e.headers
+    except Exception as e:
+        print(f"Error handling {scope['path']}: {e}")
+        status, body = 500, service.to_json({'error': 'internal server error'})
+        headers = [(b'content-type', b'application/json')]
+
+    await send_response(send, status, body, headers)
+    observe_request(scope['path'] if scope['path'] in ROUTES else 'unmatched', scope['method'], status, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("Starting ASGI web server...")
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -1,233 +1,752 @@
-from flask import Flask, render_template, request, jsonify
-import numpy as np
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import ast
-import pickle
-import os
-import gzip
-import base64
-
-app = Flask(__name__)
-
-# Global variables to store the model and data
-movies_df = None
-similarity_matrix = None
-cv = None
-
-def load_and_process_data():
-    """Load and process the movie data"""
-    global movies_df, similarity_matrix, cv
-    
-    print("Loading movie datasets...")
-    
-    try:
-        # Try to load from local files first
-        movies_path = r"C:\Users\akshi\OneDrive\Desktop\tmdb_5000_movies.csv"
-        credits_path = r"C:\Users\akshi\OneDrive\Desktop\tmdb_5000_credits.csv"
-        
-        if os.path.exists(movies_path) and os.path.exists(credits_path):
-            # Load the datasets
-            movies = pd.read_csv(movies_path)
-            credits = pd.read_csv(credits_path)
-            
-            print(f"Movies dataset: {movies.shape}")
-            print(f"Credits dataset: {credits.shape}")
-            
-            # Merge datasets
-            movies = movies.merge(credits, on='title')
-            print(f"Merged dataset: {movies.shape}")
-            
-            # Select relevant columns
-            movies = movies[['genres', 'title', 'overview', 'keywords', 'id', 'cast', 'crew']]
-            
-            # Handle missing values
-            movies['overview'] = movies['overview'].fillna("")
-            movies.dropna(inplace=True)
-            print(f"Final dataset: {movies.shape}")
-            
-            # Function to convert string lists to actual lists
-            def convert(obj):
-                try:
-                    l = []
-                    for i in ast.literal_eval(obj):
-                        l.append(i['name'])
-                    return l
-                except:
-                    return []
-
-            def fetch_director(obj):
-                try:
-                    l = []
-                    for i in ast.literal_eval(obj):
-                        if i['job'] == 'Director':
-                            l.append(i['name'])
-                            break
-                    return l
-                except:
-                    return []
-
-            print("Processing movie features...")
-            
-            # Apply conversions
-            movies['genres'] = movies['genres'].apply(convert)
-            movies['keywords'] = movies['keywords'].apply(convert)
-            movies['cast'] = movies['cast'].apply(convert)
-            movies['crew'] = movies['crew'].apply(fetch_director)
-            
-            # Convert overview to list of words
-            movies['overview'] = movies['overview'].apply(lambda x: x.split())
-            
-            # Clean up text (remove spaces)
-            movies['genres'] = movies['genres'].apply(lambda x: [i.replace(" ", "") for i in x] if isinstance(x, list) else x)
-            movies['keywords'] = movies['keywords'].apply(lambda x: [i.replace(" ", "") for i in x] if isinstance(x, list) else x)
-            movies['overview'] = movies['overview'].apply(lambda x: [i.replace(" ", "") for i in x] if isinstance(x, list) else x)
-            
-            # Create tags
-            movies['tags'] = movies['overview'] + movies['genres'] + movies['keywords'] + movies['cast'] + movies['crew']
-            
-            # Create final dataframe
-            movies_df = movies[['id', 'title', 'tags']].copy()
-            movies_df['tags'] = movies_df['tags'].apply(lambda x: ' '.join(x))
-            
-            print(f"Processed {len(movies_df)} movies")
-            
-            # Create vectors
-            print("Creating movie vectors...")
-            cv = CountVectorizer(max_features=5000, stop_words='english')
-            vectors = cv.fit_transform(movies_df['tags']).toarray()
-            
-            # Calculate similarity
-            print("Calculating similarities...")
-            similarity_matrix = cosine_similarity(vectors)
-            
-            # Save processed data for faster loading
-            save_processed_data()
-            
-            print("Data processing complete!")
-            
-        else:
-            print("CSV files not found. Please ensure the movie datasets are in the correct location.")
-            return False
-            
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return False
-    
-    return True
-
-def save_processed_data():
-    """Save processed data for faster loading"""
-    try:
-        data = {
-            'movies_df': movies_df,
-            'similarity_matrix': similarity_matrix,
-            'cv': cv
-        }
-        
-        with gzip.open('processed_data.pkl.gz', 'wb') as f:
-            pickle.dump(data, f)
-        
-        print("Processed data saved successfully!")
-    except Exception as e:
-        print(f"Error saving data: {e}")
-
-def load_processed_data():
-    """Load previously processed data"""
-    global movies_df, similarity_matrix, cv
-    
-    try:
-        if os.path.exists('processed_data.pkl.gz'):
-            with gzip.open('processed_data.pkl.gz', 'rb') as f:
-                data = pickle.load(f)
-            
-            movies_df = data['movies_df']
-            similarity_matrix = data['similarity_matrix']
-            cv = data['cv']
-            
-            print(f"Loaded processed data with {len(movies_df)} movies")
-            return True
-    except Exception as e:
-        print(f"Error loading processed data: {e}")
-    
-    return False
-
-def recommend_movies(movie_title):
-    """Get movie recommendations"""
-    try:
-        movie_index = movies_df[movies_df['title'] == movie_title].index[0]
-        distances = similarity_matrix[movie_index]
-        movies_list = sorted(list(enumerate(distances)), reverse=True, key=lambda x: x[1])[1:6]
-        
-        recommended_movies = []
-        for i in movies_list:
-            recommended_movies.append(movies_df.iloc[i[0]].title)
-        
-        return recommended_movies
-    except:
-        return []
-
-def search_movies(query):
-    """Search for movies by title"""
-    if not query:
-        return []
-    
-    query = query.lower()
-    matching_movies = []
-    
-    for title in movies_df['title']:
-        if query in title.lower():
-            matching_movies.append(title)
-            if len(matching_movies) >= 10:  # Limit to 10 results
-                break
-    
-    return matching_movies
-
-@app.route('/')
-def home():
-    """Home page"""
-    return render_template('index.html')
-
-@app.route('/api/search')
-def search():
-    """API endpoint for movie search"""
-    query = request.args.get('q', '')
-    print(query)
-    results = search_movies(query)
-    return jsonify(results)
-
-@app.route('/api/recommend')
-def recommend():
-    """API endpoint for movie recommendations"""
-    movie_title = request.args.get('movie', '')
-    recommendations = recommend_movies(movie_title)
-    return jsonify(recommendations)
-
-@app.route('/api/movies')
-def get_movies():
-    """API endpoint to get all movies"""
-    movies_list = movies_df['title'].tolist()
-    return jsonify(movies_list)
-
-@app.route('/health')
-def health_check():
-    """Health check endpoint for deployment"""
-    return jsonify({
-        'status': 'healthy',
-        'movies_loaded': len(movies_df) if movies_df is not None else 0
-    })
-
-if __name__ == '__main__':
-    # Try to load processed data first
-    if not load_processed_data():
-        # If no processed data, load and process from scratch
-        if not load_and_process_data():
-            print("Failed to load movie data. Please check your CSV files.")
-            exit(1)
-    
-    # Create templates directory if it doesn't exist
-    os.makedirs('templates', exist_ok=True)
-    
-    print("Starting Flask web server...")
-    app.run(debug=False, host='0.0.0.0', port=int(os.environ.get('PORT', 5000))) 
+from flask import Flask, g, has_request_context, render_template, request, jsonify
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from ingest import tmdb_paths
+from pipeline import run_pipeline, text_query
+from search import SearchIndex, TitleIndex, is_movie_reference
+from filters import CatalogFilter, parse_filter_args
+from artifact import (ARTIFACT_DIR, Catalog, artifact_size, build_lock, current_generation, load_artifact,
+                      model_arrays, save_model)
+from engine import load_engine
+from cache import LRUCache
+from profiling import finish_profile, profile_bytes, profile_text, profiles, start_profile
+from metrics import build_stage, observe_request, record_cache_lookup, record_model, record_stage, render_metrics
+import os
+import base64
+import hmac
+import json
+import signal
+import threading
+import time
+import uuid
+
+app = Flask(__name__)
+
+class ModelState:
+    """Everything served for one artifact generation
+
+    Built completely before it is published, then swapped in with a single
+    assignment to `model`, so a request sees either the old or the new
+    generation and never a mix of both. The catalog, indexes and payloads
+    are read in place from the generation's arrays, which are memory-mapped
+    when loaded from an artifact, so workers share them instead of each
+    building its own copy.
+    """
+    
+    def __init__(self, generation, arrays, engine):
+        self.generation = generation
+        self.engine = engine
+        self.cv = CountVectorizer(vocabulary=arrays['vocabulary'].tolist())
+        self.catalog = Catalog(arrays)
+        
+        with build_stage('search_index'):
+            self.title_index = TitleIndex.from_arrays(arrays, self.catalog.titles)
+            self.search_index = SearchIndex.from_arrays(arrays, self.catalog.titles)
+        with build_stage('filter_index'):
+            self.catalog_filter = CatalogFilter.from_arrays(arrays)
+        
+        # Precomputed /api/movies payloads
+        self.movies_payload = arrays['movies_json']
+        self.movies_payload_gzip = arrays['movies_json_gzip']
+        self.loaded_at = time.time()
+        self.load_seconds = None
+    
+    def check(self):
+        """Raise ValueError unless the state is consistent and answers a query"""
+        if not len(self.catalog):
+            raise ValueError("catalog is empty")
+        if self.engine.vectors.shape[0] != len(self.catalog):
+            raise ValueError(f"engine has {self.engine.vectors.shape[0]} rows for {len(self.catalog)} movies")
+        self.engine.neighbors(0, 1)
+
+# Model being served; replaced as a whole by activate(), never modified in place
+model = None
+
+# Model lifecycle reported by /health: 'idle' until loading starts, then 'loading', 'ready' or 'failed'
+model_state = 'idle'
+model_state_lock = threading.Lock()
+
+# Held while a new generation is loaded, so reload triggers never load twice at once
+reload_lock = threading.Lock()
+
+# Seconds between checks of the CURRENT pointer for a new generation; 0 disables watching
+ARTIFACT_WATCH_INTERVAL = float(os.environ.get('ARTIFACT_WATCH_INTERVAL', 10))
+
+# Shared secret for the admin endpoints, sent as X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Process whose watcher thread is running; only serving processes start one, never the gunicorn master
+watcher_pid = None
+
+# Last generation that failed to load, so the watcher does not retry it every interval
+failed_generation = None
+
+# Serialized responses for repeated recommendation and search queries
+recommend_cache = LRUCache(on_lookup=lambda hit: record_cache_lookup('recommend', hit))
+search_cache = LRUCache(on_lookup=lambda hit: record_cache_lookup('search', hit))
+
+# Limits for the batch recommendation endpoint
+MAX_K = 100
+MAX_BATCH_SIZE = 10000
+
+# Longest description accepted by the free-text recommendation endpoint
+MAX_TEXT_LENGTH = 5000
+
+# Cast members kept per movie when building the model; None keeps them all
+CAST_LIMIT = None
+
+# Seconds clients and proxies may reuse a GET API response
+CACHE_MAX_AGE = int(os.environ.get('CACHE_MAX_AGE', 300))
+
+# Fields the catalog endpoints can return, page size limits and export chunking
+CATALOG_FIELDS = ['id', 'title', 'popularity', 'vote_count']
+DEFAULT_FIELDS = ['id', 'title']
+DEFAULT_PAGE_SIZE = 100
+
+# Bytes of a precomputed payload copied per chunk when streaming it
+PAYLOAD_CHUNK_BYTES = 256 * 1024
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_ROWS = 1000
+
+def load_and_process_data():
+    """Load and process the movie data"""
+    print("Loading movie datasets...")
+    
+    try:
+        # Try to load from local files first
+        movies_path, credits_path = tmdb_paths()
+        
+        if os.path.exists(movies_path) and os.path.exists(credits_path):
+            start = time.perf_counter()
+            
+            # Run the pipeline, reusing any stages cached by an earlier run
+            movies_df, cv, similarity_engine, _ = run_pipeline(movies_path, credits_path, cast_limit=CAST_LIMIT,
+                                                               on_stage=record_stage)
+            print(f"Processed {len(movies_df)} movies")
+            
+            # Save processed data for faster loading, then serve it memory-mapped like any generation
+            with build_stage('save'):
+                generation = save_processed_data(movies_df, cv, similarity_engine, CAST_LIMIT)
+            if generation:
+                state, _ = load_generation(generation)
+            else:
+                vocabulary = sorted(cv.vocabulary_, key=cv.vocabulary_.get)
+                state = ModelState(f"unsaved-{uuid.uuid4().hex[:12]}", model_arrays(movies_df, vocabulary, similarity_engine),
+                                   similarity_engine)
+            activate(state, time.perf_counter() - start, artifact_size(generation) if generation else None)
+            
+            print("Data processing complete!")
+            
+        else:
+            print("CSV files not found. Please ensure the movie datasets are in the correct location.")
+            return False
+            
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        return False
+    
+    return True
+
+def save_processed_data(movies_df, cv, similarity_engine, cast_limit=None):
+    """Save processed data as a new memory-mapped artifact generation
+
+    cast_limit is recorded so incremental updates parse cast lists the same way.
+    """
+    try:
+        vocabulary = sorted(cv.vocabulary_, key=cv.vocabulary_.get)
+        generation = save_model(movies_df, vocabulary, similarity_engine, cast_limit=cast_limit)
+        print(f"Processed data saved as artifact generation {generation}")
+        return generation
+    except Exception as e:
+        print(f"Error saving data: {e}")
+        return None
+
+def load_generation(generation=None, root=ARTIFACT_DIR, verify=False):
+    """Load and check an artifact generation next to the one being served
+
+    With verify=True the array checksums are checked too. Returns the new
+    ModelState and the seconds it took; raises if the generation cannot be
+    loaded or fails its check.
+    """
+    start = time.perf_counter()
+    with build_stage('artifact_load'):
+        manifest, arrays = load_artifact(generation, root, verify)
+        similarity_engine = load_engine(manifest['engine'], arrays)
+    state = ModelState(manifest['generation'], arrays, similarity_engine)
+    state.check()
+    return state, time.perf_counter() - start
+
+def activate(state, load_seconds, artifact_bytes=None):
+    """Start serving a loaded model with one reference swap
+
+    Requests that already started keep the state they took, so they finish
+    on the previous generation.
+    """
+    global model
+    state.load_seconds = load_seconds
+    model = state
+    recommend_cache.clear()
+    search_cache.clear()
+    record_model(len(state.catalog), artifact_bytes)
+
+def load_processed_data(root=ARTIFACT_DIR):
+    """Load the current artifact generation, memory-mapping its arrays"""
+    try:
+        if current_generation(root) is not None:
+            state, seconds = load_generation(root=root)
+            activate(state, seconds, artifact_size(state.generation, root))
+            
+            print(f"Loaded artifact generation {state.generation} with {len(state.catalog)} movies")
+            return True
+    except Exception as e:
+        print(f"Error loading processed data: {e}")
+    
+    return False
+
+def reload_model(root=ARTIFACT_DIR):
+    """Serve the current artifact generation if it is not the one being served
+
+    The new generation is loaded and checked while the old one keeps
+    serving, and its checksums are verified since it was written while
+    the server ran; on any error the old one stays. Returns 'reloaded',
+    'unchanged', 'busy' (another reload is running) or 'failed'.
+    """
+    global failed_generation
+    if not reload_lock.acquire(blocking=False):
+        return 'busy'
+    generation = None
+    try:
+        generation = current_generation(root)
+        if generation is None or (model is not None and model.generation == generation):
+            return 'unchanged'
+        
+        with build_stage('reload'):
+            state, seconds = load_generation(generation, root, verify=True)
+        activate(state, seconds, artifact_size(generation, root))
+        print(f"Reloaded artifact generation {generation} in {seconds:.2f}s")
+        return 'reloaded'
+    except Exception as e:
+        failed_generation = generation
+        print(f"Error reloading artifact generation {generation}: {e}")
+        return 'failed'
+    finally:
+        reload_lock.release()
+
+def watch_artifacts(interval=ARTIFACT_WATCH_INTERVAL, root=ARTIFACT_DIR):
+    """Reload whenever the CURRENT pointer names a new generation
+
+    While no model is being served, a first load that failed is retried
+    instead, so e.g. a worker forked after a failed preload recovers.
+    """
+    while True:
+        time.sleep(interval)
+        if model is None:
+            start_loading(background=False, retry=True)
+            continue
+        generation = current_generation(root)
+        if model is not None and generation not in (model.generation, failed_generation):
+            reload_model(root)
+
+def start_watching():
+    """Start the artifact watcher in this process unless it runs or is disabled"""
+    global watcher_pid
+    if ARTIFACT_WATCH_INTERVAL <= 0 or watcher_pid == os.getpid():
+        return
+    watcher_pid = os.getpid()
+    threading.Thread(target=watch_artifacts, name='artifact-watcher', daemon=True).start()
+
+def reset_reload_lock():
+    """Give a forked child its own reload lock, since the parent may have held it while forking"""
+    global reload_lock
+    reload_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=reset_reload_lock)
+
+def install_reload_signal():
+    """Reload on SIGHUP, in a thread so the signal handler returns at once"""
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=reload_model, daemon=True).start())
+
+def load_model_data():
+    """Load the current artifact, or build one from the CSVs; returns True when ready
+
+    Builds run under the artifact directory's lock: when several workers
+    start without an artifact, one builds and the others wait, then load
+    the generation it saved.
+    """
+    global model_state
+    model_state = 'loading'
+    loaded = load_processed_data()
+    if not loaded:
+        with build_lock():
+            loaded = load_processed_data() or load_and_process_data()
+    model_state = 'ready' if loaded else 'failed'
+    if not loaded:
+        print("Failed to load movie data. Please check your CSV files.")
+    return loaded
+
+def start_loading(background=True, retry=False):
+    """Start loading the model unless it already started, or with retry=True failed
+
+    By default the model loads in a daemon thread so the server can accept
+    connections (and answer /health) meanwhile. With background=False it
+    loads before returning, e.g. in the gunicorn master before workers fork.
+    Serving processes call start_watching() separately.
+    """
+    global model_state
+    with model_state_lock:
+        if model_state != 'idle' and not (retry and model_state == 'failed'):
+            return
+        model_state = 'loading'
+    if background:
+        threading.Thread(target=load_model_data, name='model-loader', daemon=True).start()
+    else:
+        load_model_data()
+
+def current_model():
+    """Model for the current request, taken once so a reload never changes it mid-request"""
+    if has_request_context():
+        if 'model' not in g:
+            g.model = model
+        return g.model
+    return model
+
+def model_ready():
+    """True once a complete model is being served"""
+    return model is not None
+
+def to_json(data):
+    """Serialize data to compact JSON bytes"""
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def json_response(payload):
+    """Response carrying already serialized JSON bytes"""
+    return app.response_class(payload, mimetype='application/json')
+
+def payload_chunks(payload):
+    """Bytes of a uint8 payload array, copied a chunk at a time instead of all at once"""
+    for start in range(0, len(payload), PAYLOAD_CHUNK_BYTES):
+        yield payload[start:start + PAYLOAD_CHUNK_BYTES].tobytes()
+
+def payload_response(payload):
+    """JSON response streamed from a memory-mapped payload array"""
+    response = app.response_class(payload_chunks(payload), mimetype='application/json')
+    response.headers['Content-Length'] = str(len(payload))
+    return response
+
+def parse_fields(value):
+    """Catalog fields requested as a comma-separated list"""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = [field.strip() for field in value.split(',')]
+    unknown = [field for field in fields if field not in CATALOG_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}; choose from {CATALOG_FIELDS}")
+    return fields
+
+def catalog_rows(catalog, fields, start, stop):
+    """Catalog rows in [start, stop) as dicts of the selected fields"""
+    columns = [catalog.column(field, start, stop) for field in fields]
+    return [dict(zip(fields, values)) for values in zip(*columns)]
+
+def encode_cursor(generation, offset):
+    """Opaque cursor for the row offset of the next page"""
+    return base64.urlsafe_b64encode(f'{generation}:{offset}'.encode()).decode()
+
+def decode_cursor(cursor):
+    """Generation and row offset stored in a cursor"""
+    try:
+        generation, offset = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(':', 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+    if offset < 0:
+        raise ValueError("invalid cursor")
+    return generation, offset
+
+def movies_page(cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None, state=None):
+    """One page of the catalog with the cursor of the next page
+
+    Raises ValueError for invalid parameters and LookupError for a cursor
+    issued for another artifact generation.
+    """
+    state = state or current_model()
+    catalog = state.catalog
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    fields = parse_fields(fields)
+    generation, offset = decode_cursor(cursor) if cursor is not None else (state.generation, 0)
+    if generation != state.generation:
+        raise LookupError('the catalog changed since this cursor was issued; start again without a cursor')
+    if cursor is not None and offset >= len(catalog):
+        # Cursors are only issued for offsets of remaining rows
+        raise ValueError("invalid cursor")
+    
+    stop = min(offset + limit, len(catalog))
+    return {
+        'movies': catalog_rows(catalog, fields, offset, stop),
+        'next_cursor': encode_cursor(state.generation, stop) if stop < len(catalog) else None,
+    }
+
+def recommend_movies(movie_title, movie_id=None, include=(), exclude=(), min_votes=0, popularity_weight=0.0,
+                     state=None):
+    """Get movie recommendations
+
+    Genre include/exclude lists and a minimum vote count restrict the
+    candidates, and popularity_weight blends popularity into the ranking.
+    """
+    state = state or current_model()
+    try:
+        movie_index = state.title_index.lookup(movie_title, movie_id)
+        if movie_index is None:
+            return []
+        allowed = state.catalog_filter.mask(include, exclude, min_votes)
+        movies_list, _ = state.engine.neighbors(
+            movie_index, 5, allowed, state.catalog_filter.popularity, popularity_weight
+        )
+        
+        return state.catalog.titles.take(movies_list)
+    except:
+        return []
+
+def resolve_movie(movie, state=None):
+    """Row position for a title or a TMDB id, or None if unknown"""
+    state = state or current_model()
+    if isinstance(movie, int):
+        return state.title_index.lookup(movie_id=movie)
+    return state.title_index.lookup(movie)
+
+def recommend_movies_batch(movies, k=5, state=None):
+    """Get recommendations for many movies with one engine call
+
+    Each entry is a title or a TMDB id; unknown movies get an empty list.
+    """
+    state = state or current_model()
+    positions = [resolve_movie(movie, state) for movie in movies]
+    neighbor_ids, _ = state.engine.neighbors_batch([p for p in positions if p is not None], k)
+    
+    found = iter(state.catalog.titles.take(neighbor_ids))
+    return [next(found) if p is not None else [] for p in positions]
+
+def recommend_for_profile(movies, weights=None, k=10, state=None):
+    """Get recommendations for a whole watch history
+
+    Seeds are titles or TMDB ids with optional weights; unknown seeds are
+    ignored and the seeds themselves are never recommended.
+    """
+    state = state or current_model()
+    weights = [1.0] * len(movies) if weights is None else weights
+    seeds = [(resolve_movie(movie, state), weight) for movie, weight in zip(movies, weights)]
+    seeds = [(position, weight) for position, weight in seeds if position is not None]
+    if not seeds:
+        return []
+    
+    positions, weights = zip(*seeds)
+    movies_list, _ = state.engine.profile(positions, weights, k)
+    return state.catalog.titles.take(movies_list)
+
+def recommend_for_text(text, k=10, state=None):
+    """Get the movies best matching a free-text description, with their scores"""
+    state = state or current_model()
+    movies_list, scores = state.engine.text_neighbors(text_query(state.cv, text), k)
+    return [
+        {'id': int(movie_id), 'title': title, 'score': round(float(score), 4)}
+        for movie_id, title, score in zip(state.catalog.ids[movies_list], state.catalog.titles.take(movies_list), scores)
+    ]
+
+def search_movies(query, fuzzy=0, state=None):
+    """Search for movies by title, best matches first"""
+    return (state or current_model()).search_index.search(query, fuzzy=fuzzy)
+
+@app.before_request
+def start_timer():
+    """Remember when the request started, for the latency histograms"""
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def start_profiling():
+    """Profile sampled requests and requests with a valid X-Profile-Signature"""
+    g.profiler = start_profile(request.method, request.full_path, request.headers.get('X-Profile-Signature'))
+
+@app.before_request
+def require_model():
+    """Answer API requests with 503 until the model is ready, never with an empty model
+
+    Also starts loading and watching if nothing did yet, which is the case
+    when a WSGI host (flask run, Vercel, PythonAnywhere) serves the app
+    without running __main__ or the gunicorn hooks; both calls do nothing
+    once started.
+    """
+    if current_model() is None:
+        start_loading()
+        start_watching()
+    if request.path.startswith('/api/') and current_model() is None:
+        response = jsonify({'error': 'model is loading'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    return None
+
+@app.before_request
+def check_not_modified():
+    """Answer revalidation of the current generation without touching the engine"""
+    state = current_model()
+    if request.method != 'GET' or state is None or not request.path.startswith('/api/'):
+        return None
+    
+    for etag in (state.generation, f'{state.generation}-gzip'):
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+    return None
+
+@app.after_request
+def add_cache_headers(response):
+    """Tie GET API responses to the artifact generation they were built from"""
+    state = g.get('model')
+    if request.method == 'GET' and state is not None and request.path.startswith('/api/') \
+            and response.status_code in (200, 304):
+        if not response.get_etag()[0]:
+            gzipped = response.headers.get('Content-Encoding') == 'gzip'
+            response.set_etag(f'{state.generation}-gzip' if gzipped else state.generation)
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}'
+        response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def record_request(response):
+    """Count the request and record its latency under its route pattern"""
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
+@app.teardown_request
+def finish_profiling(exc):
+    """Stop the request's profiler, even after an error, and keep its trace if it is among the slowest"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        finish_profile(profiler, request.method, request.full_path.rstrip('?'), time.perf_counter() - g.request_start)
+
+@app.route('/')
+def home():
+    """Home page"""
+    return render_template('index.html')
+
+@app.route('/api/search')
+def search():
+    """API endpoint for movie search"""
+    query = request.args.get('q', '')
+    fuzzy = request.args.get('fuzzy', 0, type=int)
+    payload = search_cache.get_or_compute(
+        (current_model().generation, query, fuzzy), lambda: to_json(search_movies(query, fuzzy))
+    )
+    return json_response(payload)
+
+@app.route('/api/recommend')
+def recommend():
+    """API endpoint for movie recommendations"""
+    movie_title = request.args.get('movie', '')
+    movie_id = request.args.get('id', type=int)
+    try:
+        filters = parse_filter_args(request.args, current_model().catalog_filter)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    payload = recommend_cache.get_or_compute(
+        (current_model().generation, movie_title, movie_id, *filters.values()),
+        lambda: to_json(recommend_movies(movie_title, movie_id, **filters))
+    )
+    return json_response(payload)
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """API endpoint for recommendations for many movies at once"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'request body must be a JSON object'}), 400
+    movies = payload.get('movies', [])
+    k = payload.get('k', 5)
+    
+    if (not isinstance(movies, list) or len(movies) > MAX_BATCH_SIZE
+            or not all(is_movie_reference(movie) for movie in movies)):
+        return jsonify({'error': f'movies must be a list of at most {MAX_BATCH_SIZE} titles or ids'}), 400
+    if not isinstance(k, int) or not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be an integer between 1 and {MAX_K}'}), 400
+    
+    recommendations = recommend_movies_batch(movies, k)
+    return jsonify([
+        {'movie': movie, 'recommendations': recs}
+        for movie, recs in zip(movies, recommendations)
+    ])
+
+@app.route('/api/recommend/profile', methods=['POST'])
+def recommend_profile():
+    """API endpoint for recommendations based on a list of watched movies"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'request body must be a JSON object'}), 400
+    history = payload.get('movies', [])
+    k = payload.get('k', 10)
+    
+    if not isinstance(history, list) or not 1 <= len(history) <= MAX_BATCH_SIZE:
+        return jsonify({'error': f'movies must be a list of 1 to {MAX_BATCH_SIZE} titles, ids or {{"movie", "weight"}} objects'}), 400
+    if not isinstance(k, int) or not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be an integer between 1 and {MAX_K}'}), 400
+    
+    movies, weights = [], []
+    for entry in history:
+        if isinstance(entry, dict):
+            entry, weight = entry.get('movie'), entry.get('weight', 1.0)
+        else:
+            weight = 1.0
+        if not is_movie_reference(entry):
+            return jsonify({'error': 'each movie must be a title, an id or a {"movie", "weight"} object'}), 400
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not np.isfinite(weight) or weight <= 0:
+            return jsonify({'error': 'weight must be a positive finite number'}), 400
+        movies.append(entry)
+        weights.append(weight)
+    
+    return jsonify(recommend_for_profile(movies, weights, k))
+
+@app.route('/api/recommend/text', methods=['POST'])
+def recommend_text():
+    """API endpoint for recommendations from a free-text description"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'request body must be a JSON object'}), 400
+    text = payload.get('text', '')
+    k = payload.get('k', 10)
+    
+    if not isinstance(text, str) or not text.strip() or len(text) > MAX_TEXT_LENGTH:
+        return jsonify({'error': f'text must be a non-empty string of at most {MAX_TEXT_LENGTH} characters'}), 400
+    if not isinstance(k, int) or not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be an integer between 1 and {MAX_K}'}), 400
+    
+    text = ' '.join(text.split())
+    payload = recommend_cache.get_or_compute(
+        (current_model().generation, 'text', text.lower(), k), lambda: to_json(recommend_for_text(text, k))
+    )
+    return json_response(payload)
+
+@app.route('/api/movies')
+def get_movies():
+    """API endpoint to get all movie titles, or one page of the catalog
+
+    Without paging parameters the full title list is served from
+    precomputed bytes. With cursor, limit or fields, one page of movies
+    with the selected fields is returned along with the next cursor.
+    """
+    if not any(name in request.args for name in ('cursor', 'limit', 'fields')):
+        state = current_model()
+        if 'gzip' in request.accept_encodings:
+            response = payload_response(state.movies_payload_gzip)
+            response.headers['Content-Encoding'] = 'gzip'
+            return response
+        return payload_response(state.movies_payload)
+    
+    try:
+        page = movies_page(
+            request.args.get('cursor'),
+            request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            request.args.get('fields'),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 410
+    return jsonify(page)
+
+@app.route('/api/movies/export')
+def export_movies():
+    """API endpoint streaming the whole catalog as NDJSON, one movie per line"""
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    catalog = current_model().catalog
+    
+    def generate():
+        for start in range(0, len(catalog), EXPORT_CHUNK_ROWS):
+            rows = catalog_rows(catalog, fields, start, start + EXPORT_CHUNK_ROWS)
+            yield ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+    
+    return app.response_class(generate(), mimetype='application/x-ndjson')
+
+def health_payload(state):
+    """Liveness details: loading state, generation served and when it was loaded"""
+    return {
+        'status': 'healthy' if state is not None else model_state,
+        'movies_loaded': len(state.catalog) if state is not None else 0,
+        'generation': state.generation if state is not None else None,
+        'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(state.loaded_at)) if state is not None else None,
+        'load_seconds': round(state.load_seconds, 3) if state is not None and state.load_seconds is not None else None,
+    }
+
+@app.route('/health')
+def health_check():
+    """Liveness probe: the process is up, whether or not the model is loaded yet"""
+    return jsonify(health_payload(current_model()))
+
+@app.route('/ready')
+def readiness_check():
+    """Readiness probe: 200 only once the model is serving"""
+    state = current_model()
+    if state is None:
+        return jsonify({'ready': False, 'status': model_state}), 503
+    return jsonify({'ready': True, 'generation': state.generation})
+
+def admin_authorized():
+    """True if ADMIN_TOKEN is set and the request carries it in X-Admin-Token"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Admin endpoint loading the current artifact generation if it changed"""
+    if not admin_authorized():
+        return jsonify({'error': 'forbidden'}), 403
+    result = reload_model()
+    status = {'reloaded': 200, 'unchanged': 200, 'busy': 409, 'failed': 500}[result]
+    return jsonify({'result': result, 'generation': model.generation if model is not None else None}), status
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    """Admin endpoint listing the slowest profiled requests, slowest first"""
+    if not admin_authorized():
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify(profiles.entries())
+
+@app.route('/admin/profiles/<int:profile_id>')
+def admin_profile(profile_id):
+    """Admin endpoint downloading one profile as a pstats file, or as text with ?format=text"""
+    if not admin_authorized():
+        return jsonify({'error': 'forbidden'}), 403
+    profiler = profiles.profiler(profile_id)
+    if profiler is None:
+        return jsonify({'error': 'profile not found'}), 404
+    if request.args.get('format') == 'text':
+        return app.response_class(profile_text(profiler), mimetype='text/plain')
+    response = app.response_class(profile_bytes(profiler), mimetype='application/octet-stream')
+    response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}.prof'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics, merged across workers in multiprocess mode"""
+    payload, content_type = render_metrics()
+    return app.response_class(payload, content_type=content_type)
+
+if __name__ == '__main__':
+    # Load the model in the background so the server listens right away
+    start_loading()
+    start_watching()
+    install_reload_signal()
+    
+    # Create templates directory if it doesn't exist
+    os.makedirs('templates', exist_ok=True)
+    
+    print("Starting Flask web server...")
+    app.run(debug=False, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
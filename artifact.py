@@ -0,0 +1,278 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from engine import load_engine
+from filters import CatalogFilter
+from search import SearchIndex, StringTable, TitleIndex
+
+try:
+    import fcntl
+except ImportError:  # fcntl is Unix-only; without it builds are not serialized
+    fcntl = None
+
+# Bump whenever the set or meaning of the stored arrays changes
+SCHEMA_VERSION = 4
+
+# Directory holding one sub-directory per artifact generation
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', 'artifacts')
+
+# Generations kept when a new one is saved; 0 (the default) keeps them all
+ARTIFACT_KEEP = int(os.environ.get('ARTIFACT_KEEP', 0))
+
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+BUILD_LOCK_FILE = '.build.lock'
+PRECOMPUTE_JOB_PREFIX = '.precompute-'
+
+
+def file_checksum(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decode_titles(blob, offsets):
+    """Unpack all titles of a StringTable stored in an artifact at once"""
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [data[start:stop].decode('utf-8') for start, stop in zip(offsets, offsets[1:])]
+
+
+def current_generation(root=ARTIFACT_DIR):
+    """Id of the generation the CURRENT pointer names, or None"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current_generation(generation, root=ARTIFACT_DIR):
+    """Atomically point CURRENT at a generation"""
+    staging = os.path.join(root, f'.{CURRENT_FILE}.{os.getpid()}')
+    with open(staging, 'w') as f:
+        f.write(generation)
+    os.replace(staging, os.path.join(root, CURRENT_FILE))
+
+
+@contextmanager
+def build_lock(root=ARTIFACT_DIR):
+    """Exclusive lock on an artifact directory, shared by every process using it
+
+    Blocks until no other process holds it, so only one process builds a
+    generation at a time. The lock is released when the block exits or the
+    process dies.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, BUILD_LOCK_FILE), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def artifact_size(generation=None, root=ARTIFACT_DIR):
+    """Total bytes of the files in an artifact generation"""
+    path = os.path.join(root, generation or current_generation(root))
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def prune_generations(root=ARTIFACT_DIR, keep=ARTIFACT_KEEP):
+    """Delete all but the newest `keep` generations; returns the deleted ids
+
+    The current generation and the one it was derived from are never
+    deleted, so a bad update can still be rolled back, and neither is a
+    generation an unfinished precompute job reads. Hidden entries (staging
+    directories, precompute jobs, the build lock) are left alone.
+    """
+    if keep <= 0:
+        return []
+    current = current_generation(root)
+    protected = {current}
+    for entry in os.scandir(root):
+        if entry.name.startswith(PRECOMPUTE_JOB_PREFIX):
+            # .precompute-<generation>-k<k>, possibly with a staging suffix
+            protected.add(entry.name[len(PRECOMPUTE_JOB_PREFIX):].rsplit('-k', 1)[0])
+    if current is not None:
+        try:
+            with open(os.path.join(root, current, MANIFEST_FILE)) as f:
+                protected.add(json.load(f).get('parent'))
+        except (OSError, ValueError):
+            pass
+
+    # Generation ids start with their creation time, so they sort oldest first
+    generations = sorted(
+        entry.name for entry in os.scandir(root)
+        if entry.is_dir() and not entry.name.startswith('.')
+        and os.path.exists(os.path.join(entry.path, MANIFEST_FILE))
+    )
+    deleted = [generation for generation in generations[:-keep] if generation not in protected]
+    for generation in deleted:
+        shutil.rmtree(os.path.join(root, generation), ignore_errors=True)
+    return deleted
+
+
+def save_artifact(arrays, metadata, root=ARTIFACT_DIR):
+    """Write arrays as a new artifact generation and make it current
+
+    Each array is stored as a raw .npy file so it can be memory-mapped. The
+    generation is written to a hidden staging directory and renamed into
+    place, so readers never see a partial generation. Older generations
+    beyond ARTIFACT_KEEP are then pruned.
+    """
+    generation = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    staging = os.path.join(root, f'.{generation}.tmp')
+    os.makedirs(staging)
+
+    files = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        filename = f'{name}.npy'
+        np.save(os.path.join(staging, filename), array)
+        files[name] = {
+            'file': filename,
+            'dtype': str(array.dtype),
+            'shape': list(array.shape),
+            'sha256': file_checksum(os.path.join(staging, filename)),
+        }
+
+    checksum = hashlib.sha256(
+        ''.join(files[name]['sha256'] for name in sorted(files)).encode()
+    ).hexdigest()
+    manifest = {
+        'schema_version': SCHEMA_VERSION,
+        'generation': generation,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'checksum': checksum,
+        'files': files,
+        **metadata,
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(staging, os.path.join(root, generation))
+    set_current_generation(generation, root)
+    prune_generations(root)
+    return generation
+
+
+def load_artifact(generation=None, root=ARTIFACT_DIR, verify=False):
+    """Open an artifact generation with every array memory-mapped read-only
+
+    Returns (manifest, arrays). Pages are shared between all processes that
+    map the same files. Checksums are only recomputed with verify=True, since
+    that reads every byte.
+    """
+    generation = generation or current_generation(root)
+    if generation is None:
+        raise FileNotFoundError(f"No artifact generation found in {root}")
+
+    path = os.path.join(root, generation)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    if manifest.get('schema_version') != SCHEMA_VERSION:
+        raise ValueError(f"Artifact schema {manifest.get('schema_version')} is not {SCHEMA_VERSION}")
+
+    arrays = {}
+    for name, entry in manifest['files'].items():
+        filename = os.path.join(path, entry['file'])
+        if verify and file_checksum(filename) != entry['sha256']:
+            raise ValueError(f"Checksum mismatch for {filename}")
+
+        # Empty files cannot be memory-mapped. The plain ndarray view still reads
+        # the mapped pages but skips np.memmap's per-slice overhead on lookups
+        arrays[name] = np.load(filename, mmap_mode='r' if np.prod(entry['shape']) else None).view(np.ndarray)
+        if list(arrays[name].shape) != entry['shape']:
+            raise ValueError(f"Shape mismatch for {filename}")
+
+    return manifest, arrays
+
+
+class Catalog:
+    """Catalog columns of a generation, read in place from its (memory-mapped) arrays
+
+    Titles are decoded only for the rows a request returns, so a worker
+    keeps no private copy of the catalog.
+    """
+
+    COLUMNS = {'id': 'ids', 'popularity': 'popularity', 'vote_count': 'vote_count'}
+
+    def __init__(self, arrays):
+        self.ids = arrays['ids']
+        self.popularity = arrays['popularity']
+        self.vote_count = arrays['vote_count']
+        self.titles = StringTable.from_arrays(arrays, 'title')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, field, start, stop):
+        """Values of a field ('id', 'title', 'popularity' or 'vote_count') for rows [start, stop)"""
+        if field == 'title':
+            return [self.titles[position] for position in range(start, min(stop, len(self)))]
+        return getattr(self, self.COLUMNS[field])[start:stop].tolist()
+
+
+def model_arrays(movies_df, vocabulary, engine):
+    """Every array of a generation: catalog, engine, lookup indexes and the /api/movies payloads
+
+    The indexes and payloads are derived from the catalog once here, so
+    loading a generation only maps files and builds nothing.
+    """
+    titles = StringTable.from_strings(movies_df['title'])
+    ids = movies_df['id'].to_numpy(dtype=np.int64)
+    movies_json = json.dumps(movies_df['title'].tolist(), separators=(',', ':')).encode('utf-8')
+    return {
+        'ids': ids,
+        'popularity': movies_df['popularity'].to_numpy(dtype=np.float64),
+        'vote_count': movies_df['vote_count'].to_numpy(dtype=np.int64),
+        **titles.to_arrays('title'),
+        **StringTable.from_strings(movies_df['genres']).to_arrays('genre'),
+        'vocabulary': np.array(vocabulary, dtype=str),
+        **engine.to_arrays(),
+        **TitleIndex(titles, ids).to_arrays(),
+        **SearchIndex(titles, movies_df['popularity']).to_arrays(),
+        **CatalogFilter(movies_df['genres'], movies_df['popularity'], movies_df['vote_count']).to_arrays(),
+        'movies_json': np.frombuffer(movies_json, dtype=np.uint8),
+        'movies_json_gzip': np.frombuffer(gzip.compress(movies_json), dtype=np.uint8),
+    }
+
+
+def save_model(movies_df, vocabulary, engine, root=ARTIFACT_DIR, **metadata):
+    """Save a processed catalog and its engine as a new generation"""
+    arrays = model_arrays(movies_df, vocabulary, engine)
+    return save_artifact(arrays, {'engine': engine.name, 'precision': engine.precision, 'movies': len(movies_df), **metadata}, root)
+
+
+def load_model(generation=None, root=ARTIFACT_DIR, verify=False):
+    """Load a generation saved by save_model()
+
+    Returns (manifest, movies_df, vocabulary, engine); the engine works
+    directly on the memory-mapped arrays.
+    """
+    manifest, arrays = load_artifact(generation, root, verify)
+    movies_df = pd.DataFrame({
+        'id': arrays['ids'],
+        'title': decode_titles(arrays['title_blob'], arrays['title_offsets']),
+        'popularity': arrays['popularity'],
+        'vote_count': arrays['vote_count'],
+        'genres': decode_titles(arrays['genre_blob'], arrays['genre_offsets']),
+    })
+    engine = load_engine(manifest['engine'], arrays)
+    return manifest, movies_df, arrays['vocabulary'].tolist(), engine
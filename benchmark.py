@@ -0,0 +1,394 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Where generated datasets are kept between runs, one sub-directory per size and seed
+BENCHMARK_DATA_DIR = os.environ.get('BENCHMARK_DATA_DIR', 'benchmark_data')
+
+# Rows generated and written per batch
+GENERATE_CHUNK_ROWS = 10000
+
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama',
+    'Family', 'Fantasy', 'Foreign', 'History', 'Horror', 'Music', 'Mystery',
+    'Romance', 'Science Fiction', 'TV Movie', 'Thriller', 'War', 'Western',
+]
+CREW_JOBS = [
+    ('Directing', 'Director'), ('Writing', 'Screenplay'), ('Writing', 'Writer'),
+    ('Production', 'Producer'), ('Production', 'Casting'), ('Editing', 'Editor'),
+    ('Sound', 'Original Music Composer'), ('Camera', 'Director of Photography'),
+]
+LANGUAGES = ['en', 'fr', 'es', 'de', 'ja', 'it', 'zh', 'ko', 'hi', 'ru']
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ra', 'ten', 'dor', 'vi', 'sha', 'nel', 'qu', 'zen', 'bar',
+    'tis', 'mon', 'el', 'ar', 'ul', 'fen', 'gri', 'hal', 'jo', 'pre', 'sto', 'wyn',
+]
+
+MOVIES_FIELDS = [
+    'budget', 'genres', 'homepage', 'id', 'keywords', 'original_language',
+    'original_title', 'overview', 'popularity', 'production_companies',
+    'production_countries', 'release_date', 'revenue', 'runtime',
+    'spoken_languages', 'status', 'tagline', 'title', 'vote_average', 'vote_count',
+]
+CREDITS_FIELDS = ['movie_id', 'title', 'cast', 'crew']
+
+
+def make_words(rng, n):
+    """n distinct pronounceable words built from random syllables"""
+    words = set()
+    while len(words) < n:
+        lengths = rng.integers(2, 5, size=n)
+        for length in lengths:
+            words.add(''.join(SYLLABLES[i] for i in rng.integers(0, len(SYLLABLES), size=length)))
+            if len(words) == n:
+                break
+    return sorted(words)
+
+
+def zipf_weights(n, exponent=1.1):
+    """Probabilities of a Zipf-like distribution over n ranks"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_tmdb(rows, out_dir, seed=0, cast_size=10, crew_size=8):
+    """Write TMDB-shaped movies and credits CSVs with `rows` movies
+
+    The output only depends on `rows` and `seed`. List columns hold the same
+    JSON-in-CSV objects as the real dataset, and words, people and keywords
+    are drawn from Zipf-like distributions so tag frequencies look natural.
+    Returns the paths of the movies and credits CSVs.
+    """
+    from ingest import tmdb_paths
+
+    rng = np.random.default_rng(seed)
+    vocabulary = make_words(rng, 20000)
+    word_p = zipf_weights(len(vocabulary))
+    first_names = [word.title() for word in make_words(rng, 2000)]
+    last_names = [word.title() for word in make_words(rng, 5000)]
+    n_people = max(5000, rows // 2)
+    people = [
+        f'{first_names[i]} {last_names[j]}'
+        for i, j in zip(rng.integers(0, len(first_names), n_people), rng.integers(0, len(last_names), n_people))
+    ]
+    people_p = zipf_weights(n_people, 0.8)
+    keywords = [' '.join(pair) for pair in zip(vocabulary[::2], vocabulary[1::2])]
+    keyword_p = zipf_weights(len(keywords))
+
+    os.makedirs(out_dir, exist_ok=True)
+    movies_path, credits_path = tmdb_paths(out_dir)
+    titles = set()
+
+    with open(movies_path, 'w', newline='', encoding='utf-8') as movies_file, \
+            open(credits_path, 'w', newline='', encoding='utf-8') as credits_file:
+        movies_writer = csv.writer(movies_file)
+        credits_writer = csv.writer(credits_file)
+        movies_writer.writerow(MOVIES_FIELDS)
+        credits_writer.writerow(CREDITS_FIELDS)
+
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            n = min(GENERATE_CHUNK_ROWS, rows - start)
+            overview_lengths = rng.integers(10, 60, size=n)
+            overview_words = rng.choice(len(vocabulary), size=int(overview_lengths.sum()), p=word_p)
+            title_lengths = rng.integers(1, 5, size=n)
+            title_words = rng.choice(len(vocabulary), size=int(title_lengths.sum()), p=word_p)
+            genre_counts = rng.integers(1, 4, size=n)
+            keyword_counts = rng.integers(0, 12, size=n)
+            keyword_ids = rng.choice(len(keywords), size=int(keyword_counts.sum()), p=keyword_p)
+            cast_ids = rng.choice(n_people, size=n * cast_size, p=people_p)
+            crew_ids = rng.choice(n_people, size=n * crew_size, p=people_p)
+            popularity = rng.pareto(1.5, size=n) * 5
+            vote_count = rng.negative_binomial(1, 0.002, size=n)
+            vote_average = np.round(rng.normal(6.2, 1.0, size=n).clip(0, 10), 1)
+            budget = rng.integers(0, 300, size=n) * 1000000
+            runtime = rng.integers(70, 180, size=n)
+            days = rng.integers(0, 365 * 100, size=n)
+            languages = rng.integers(0, len(LANGUAGES), size=n)
+            empty_overview = rng.random(size=n) < 0.001
+
+            overview_at = title_at = keyword_at = 0
+            for i in range(n):
+                movie_id = start + i + 1
+                words = [vocabulary[w] for w in title_words[title_at:title_at + title_lengths[i]]]
+                title_at += title_lengths[i]
+                title = ' '.join(words).title()
+                if title in titles:
+                    title = f'{title} {movie_id}'
+                titles.add(title)
+
+                overview = ' '.join(vocabulary[w] for w in overview_words[overview_at:overview_at + overview_lengths[i]])
+                overview_at += overview_lengths[i]
+                genres = [
+                    {'id': int(g), 'name': GENRES[g]}
+                    for g in rng.choice(len(GENRES), size=genre_counts[i], replace=False)
+                ]
+                movie_keywords = [
+                    {'id': int(k), 'name': keywords[k]}
+                    for k in keyword_ids[keyword_at:keyword_at + keyword_counts[i]]
+                ]
+                keyword_at += keyword_counts[i]
+                cast = [
+                    {
+                        'cast_id': order, 'character': last_names[p % len(last_names)],
+                        'credit_id': f'{movie_id * 64 + order:024x}', 'gender': int(p % 3),
+                        'id': int(p), 'name': people[p], 'order': order,
+                    }
+                    for order, p in enumerate(cast_ids[i * cast_size:(i + 1) * cast_size])
+                ]
+                crew = [
+                    {
+                        'credit_id': f'{movie_id * 64 + 32 + j:024x}', 'department': CREW_JOBS[j % len(CREW_JOBS)][0],
+                        'gender': int(p % 3), 'id': int(p), 'job': CREW_JOBS[j % len(CREW_JOBS)][1], 'name': people[p],
+                    }
+                    for j, p in enumerate(crew_ids[i * crew_size:(i + 1) * crew_size])
+                ]
+                release = np.datetime64('1920-01-01') + np.timedelta64(int(days[i]), 'D')
+                language = LANGUAGES[languages[i]]
+
+                movies_writer.writerow([
+                    int(budget[i]), json.dumps(genres), '', movie_id, json.dumps(movie_keywords),
+                    language, title, '' if empty_overview[i] else overview, float(popularity[i]),
+                    '[]', '[]', str(release), int(budget[i] * 2), int(runtime[i]),
+                    json.dumps([{'iso_639_1': language, 'name': language}]), 'Released', '',
+                    title, float(vote_average[i]), int(vote_count[i]),
+                ])
+                credits_writer.writerow([movie_id, title, json.dumps(cast), json.dumps(crew)])
+
+    print(f"Wrote {rows} movies to {out_dir}")
+    return movies_path, credits_path
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def latency_summary(samples):
+    """Latency percentiles in milliseconds of a list of durations in seconds"""
+    ms = np.array(samples) * 1000
+    return {
+        'queries': len(samples),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def time_queries(function, queries):
+    """Call function once per query and summarize the latencies"""
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        function(query)
+        samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def measure(data_dir, queries=200, seed=0):
+    """Time every stage of the production build on one dataset
+
+    Runs the pipeline without its stage cache, builds the search indexes,
+    then saves and reloads the artifact and times recommend_movies() and
+    search_movies(). Each stage records its duration and the resident and
+    peak memory of the process after it ran.
+    """
+    import app_production
+    from artifact import artifact_size, save_model
+    from engine import ENGINE, VECTOR_PRECISION
+    from ingest import tmdb_paths
+    from metrics import resident_memory
+    from pipeline import run_pipeline
+    from search import SearchIndex, TitleIndex
+
+    stages = {}
+
+    def record(stage, seconds):
+        stages[stage] = {'seconds': seconds, 'rss_bytes': resident_memory(), 'peak_rss_bytes': peak_rss()}
+
+    @contextmanager
+    def timed(stage):
+        start = time.perf_counter()
+        yield
+        record(stage, time.perf_counter() - start)
+
+    movies_df, cv, engine, _ = run_pipeline(*tmdb_paths(data_dir), cache_dir=None, on_stage=record)
+    with timed('search_index'):
+        TitleIndex(movies_df['title'], movies_df['id'])
+        SearchIndex(movies_df['title'], movies_df['popularity'])
+
+    artifact_root = tempfile.mkdtemp(prefix='benchmark-artifacts-')
+    try:
+        with timed('save'):
+            vocabulary = sorted(cv.vocabulary_, key=cv.vocabulary_.get)
+            generation = save_model(movies_df, vocabulary, engine, root=artifact_root)
+        size = artifact_size(generation, artifact_root)
+        del engine, cv
+        with timed('artifact_load'):
+            if not app_production.load_processed_data(artifact_root):
+                raise RuntimeError("Could not load the saved artifact")
+
+        rng = np.random.default_rng(seed)
+        titles = movies_df['title'].to_numpy()[rng.choice(len(movies_df), size=min(queries, len(movies_df)), replace=False)]
+        prefixes = [title[:int(rng.integers(3, 9))] for title in titles]
+        typos = [title[:1] + title[2:] if len(title) > 3 else title for title in titles]
+
+        result = {
+            'rows': len(movies_df),
+            'engine': ENGINE,
+            'precision': VECTOR_PRECISION,
+            'artifact_bytes': size,
+            'stages': stages,
+            'recommend': time_queries(app_production.recommend_movies, titles),
+            'search': time_queries(app_production.search_movies, prefixes),
+            'search_fuzzy': time_queries(lambda query: app_production.search_movies(query, fuzzy=1), typos),
+            'peak_rss_bytes': peak_rss(),
+        }
+    finally:
+        shutil.rmtree(artifact_root, ignore_errors=True)
+    return result
+
+
+def run(sizes, data_root=BENCHMARK_DATA_DIR, queries=200, seed=0):
+    """Benchmark each dataset size in a fresh process
+
+    Datasets are generated on first use and kept in data_root. A separate
+    process per size keeps peak memory figures independent.
+    """
+    results = []
+    for rows in sizes:
+        data_dir = os.path.join(data_root, f'{rows}-{seed}')
+        if not os.path.exists(os.path.join(data_dir, 'tmdb_5000_credits.csv')):
+            generate_tmdb(rows, data_dir, seed)
+
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            output = f.name
+        try:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'measure', data_dir,
+                 '--queries', str(queries), '--seed', str(seed), '--output', output],
+                check=True,
+            )
+            with open(output) as f:
+                results.append(json.load(f))
+        finally:
+            os.remove(output)
+
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=1.25):
+    """Rows comparing two benchmark runs, and whether any metric regressed
+
+    Stage durations and query latencies of matching dataset sizes are
+    compared; a ratio above `threshold` counts as a regression.
+    """
+    def metrics(result):
+        values = {f"{stage}_s": entry['seconds'] for stage, entry in result['stages'].items()}
+        for query in ('recommend', 'search', 'search_fuzzy'):
+            values[f'{query}_p50_ms'] = result[query]['p50_ms']
+            values[f'{query}_p95_ms'] = result[query]['p95_ms']
+        values['peak_rss_mb'] = result['peak_rss_bytes'] / 2 ** 20
+        return values
+
+    baseline_results = {result['rows']: metrics(result) for result in baseline['results']}
+    rows, regressed = [], False
+    for result in current['results']:
+        before = baseline_results.get(result['rows'])
+        if before is None:
+            continue
+        for name, value in metrics(result).items():
+            if name not in before:
+                continue
+            ratio = value / before[name] if before[name] else 1.0
+            slower = ratio > threshold
+            regressed |= slower
+            rows.append({
+                'rows': result['rows'],
+                'metric': name,
+                'baseline': before[name],
+                'current': value,
+                'ratio': ratio,
+                'regressed': 'yes' if slower else '',
+            })
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommender on synthetic TMDB-shaped data")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help="write a synthetic dataset")
+    generate.add_argument('rows', type=int, help="number of movies")
+    generate.add_argument('out_dir', help="directory for the movies and credits CSVs")
+    generate.add_argument('--seed', type=int, default=0)
+
+    run_parser = subparsers.add_parser('run', help="benchmark one or more dataset sizes")
+    run_parser.add_argument('--rows', type=int, nargs='+', default=[5000, 50000])
+    run_parser.add_argument('--data-dir', default=BENCHMARK_DATA_DIR, help="where generated datasets are kept")
+    run_parser.add_argument('--queries', type=int, default=200, help="recommend and search queries per size")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', default='benchmark_results.json', help="JSON file for the results")
+
+    measure_parser = subparsers.add_parser('measure', help="benchmark one existing dataset in this process")
+    measure_parser.add_argument('data_dir', help="directory with tmdb_5000_movies.csv and tmdb_5000_credits.csv")
+    measure_parser.add_argument('--queries', type=int, default=200)
+    measure_parser.add_argument('--seed', type=int, default=0)
+    measure_parser.add_argument('--output', required=True, help="JSON file for the result")
+
+    compare_parser = subparsers.add_parser('compare', help="compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.25, help="ratio counted as a regression")
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate_tmdb(args.rows, args.out_dir, args.seed)
+    elif args.command == 'measure':
+        result = measure(args.data_dir, args.queries, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    elif args.command == 'run':
+        results = run(args.rows, args.data_dir, args.queries, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        for result in results['results']:
+            stages = ', '.join(f"{stage} {entry['seconds']:.2f}s" for stage, entry in result['stages'].items())
+            print(f"{result['rows']} movies: {stages}")
+            print(f"  recommend p50 {result['recommend']['p50_ms']:.2f}ms, search p50 {result['search']['p50_ms']:.2f}ms, "
+                  f"peak memory {result['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+        print(f"Results written to {args.output}")
+    elif args.command == 'compare':
+        from evaluate import print_rows
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows, regressed = compare(baseline, current, args.threshold)
+        print_rows(rows)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
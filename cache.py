@@ -0,0 +1,99 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Entries kept per response cache before the least recently used is evicted
+CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 10000))
+
+
+class LRUCache:
+    """Thread-safe mapping with a bounded size and least-recently-used eviction
+
+    `on_lookup`, if given, is called with True or False after every hit or
+    miss, e.g. to export hit ratios. Concurrent misses for the same key are
+    coalesced by get_or_compute().
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, on_lookup=None):
+        self.maxsize = maxsize
+        self.on_lookup = on_lookup
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        # Futures of values being computed, so concurrent misses wait instead of recomputing
+        self.inflight = {}
+
+    def get(self, key, default=None):
+        """Cached value for key, marking it as recently used"""
+        with self.lock:
+            hit = key in self.entries
+            if hit:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                value = self.entries[key]
+            else:
+                self.misses += 1
+                value = default
+        if self.on_lookup is not None:
+            self.on_lookup(hit)
+        return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full"""
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, computing and storing it on a miss
+
+        Only the first of several threads missing the same key at once
+        computes it; the others wait for its result (or its exception).
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self.lock:
+            # The value may have been stored since the lookup above
+            if key in self.entries:
+                return self.entries[key]
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_MISSING = object()
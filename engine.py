@@ -0,0 +1,706 @@
+import os
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+# Similarity engine: 'sparse' scores on demand, 'topk' precomputes neighbors,
+# 'lsh' scores only approximate-nearest-neighbor candidates, 'svd' scores
+# dense low-rank embeddings
+ENGINE = os.environ.get('RECOMMENDER_ENGINE', 'sparse')
+
+# Number of neighbors kept per movie in the top-K index
+NEIGHBORS_K = int(os.environ.get('NEIGHBORS_K', 50))
+
+# Random-projection LSH settings for the 'lsh' engine: more tables and probes
+# raise recall, more bits per table shrink buckets and speed up queries. The
+# defaults aim at recall@10 of about 0.9 on catalogs of a few thousand movies
+LSH_TABLES = int(os.environ.get('LSH_TABLES', 32))
+LSH_BITS = int(os.environ.get('LSH_BITS', 10))
+LSH_PROBES = int(os.environ.get('LSH_PROBES', 1))
+LSH_SEED = 42
+
+# Embedding dimensions of the 'svd' engine's randomized truncated SVD
+SVD_DIMENSIONS = int(os.environ.get('SVD_DIMENSIONS', 200))
+SVD_SEED = 42
+
+# Precision of stored vector values and neighbor scores: 'float64', 'float32',
+# or 'int8' with one float32 scale per row
+VECTOR_PRECISION = os.environ.get('VECTOR_PRECISION', 'float32')
+PRECISIONS = {'float64': np.float64, 'float32': np.float32, 'int8': np.int8}
+
+# Engines that may be built with int8 vectors. Scoring int8 rows converts
+# them to float a chunk at a time, about twice as slow as float32, so only
+# the engine serving precomputed neighbors offers it
+INT8_ENGINES = ('topk',)
+
+# Upper bound on similarity cells computed at once for a block of movies
+BLOCK_CELLS = 32 * 1024 * 1024
+
+# Stored int8 values converted to float at once while scoring
+SCORE_CHUNK = 256 * 1024
+
+
+def top_k(scores, k):
+    """Row positions and values of the k largest scores in each row
+
+    Uses partial selection, so only the k winners of each row get sorted.
+    Accepts a single score vector or a 2-D array of score rows.
+    """
+    scores = np.atleast_2d(scores)
+    k = max(min(k, scores.shape[1]), 0)
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int32), empty.astype(scores.dtype)
+
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return (np.take_along_axis(top, order, axis=1).astype(np.int32),
+            np.take_along_axis(top_scores, order, axis=1))
+
+
+def rank_scores(scores, allowed=None, prior=None, weight=0.0, rows=None):
+    """Blend similarity scores with a prior and mask out movies that are not allowed
+
+    `prior` is a per-movie score in [0, 1] mixed in as
+    (1 - weight) * similarity + weight * prior, and `allowed` a boolean mask
+    over all movies; disallowed movies score -inf so top_k() never picks
+    them. `rows` selects the movies the scores belong to.
+    """
+    if weight and prior is not None:
+        scores = (1 - weight) * scores + weight * (prior if rows is None else prior[rows])
+    if allowed is not None:
+        scores = np.where(allowed if rows is None else allowed[rows], scores, -np.inf)
+    return scores
+
+
+def quantize_rows(values, row_ids, n_rows):
+    """int8 values and per-row float32 scales so values ~= int8 * scale[row]
+
+    Each row is scaled so its largest magnitude maps to 127.
+    """
+    magnitudes = np.abs(values).astype(np.float32)
+    row_max = np.zeros(n_rows, dtype=np.float32)
+    np.maximum.at(row_max, row_ids, np.where(np.isfinite(magnitudes), magnitudes, 0))
+    scales = np.where(row_max > 0, row_max / 127, 1).astype(np.float32)
+    return np.clip(np.rint(values / scales[row_ids]), -127, 127).astype(np.int8), scales
+
+
+def quantize(vectors, precision=VECTOR_PRECISION):
+    """Normalized CSR vectors stored at a precision
+
+    Returns (vectors, scales); scales is None unless precision is 'int8'.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown vector precision: {precision}")
+    if precision != 'int8':
+        return vectors.astype(PRECISIONS[precision], copy=False), None
+
+    row_ids = np.repeat(np.arange(vectors.shape[0]), np.diff(vectors.indptr))
+    data, scales = quantize_rows(vectors.data, row_ids, vectors.shape[0])
+    return sparse.csr_matrix((data, vectors.indices, vectors.indptr), shape=vectors.shape), scales
+
+
+def quantize_dense(values, precision=VECTOR_PRECISION):
+    """Dense rows stored at a precision, like quantize() for CSR vectors"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown vector precision: {precision}")
+    if precision != 'int8':
+        return values.astype(PRECISIONS[precision], copy=False), None
+
+    n, width = values.shape
+    data, scales = quantize_rows(values.ravel(), np.repeat(np.arange(n), width), n)
+    return data.reshape(n, width), scales
+
+
+def dequantize(vectors, scales):
+    """Float CSR vectors from vectors stored by quantize()"""
+    if scales is None:
+        return vectors
+    data = vectors.data.astype(np.float32) * np.repeat(scales, np.diff(vectors.indptr))
+    return sparse.csr_matrix((data, vectors.indices, vectors.indptr), shape=vectors.shape)
+
+
+def scaled_product(matrix, right, scales=None):
+    """matrix @ right as a dense array, with int8 rows multiplied by their scales
+
+    scipy and numpy multiply int8 by floats by first converting the whole
+    int8 operand, a float copy of every stored value on each query. int8
+    rows are instead multiplied about SCORE_CHUNK values at a time, so
+    only one small chunk is ever converted.
+    """
+    if scales is None:
+        product = matrix @ right
+        return product.toarray() if sparse.issparse(product) else np.asarray(product)
+
+    n = matrix.shape[0]
+    values = matrix.nnz if sparse.issparse(matrix) else matrix.size
+    step = max(1, SCORE_CHUNK * n // max(values, 1))
+    out = np.empty((n,) + right.shape[1:], dtype=np.float32)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        if sparse.issparse(matrix):
+            # A view of the rows' stored values; slicing the matrix would copy them
+            first, last = matrix.indptr[start], matrix.indptr[stop]
+            rows = sparse.csr_matrix((matrix.data[first:last], matrix.indices[first:last],
+                                      matrix.indptr[start:stop + 1] - first), shape=(stop - start, matrix.shape[1]))
+        else:
+            rows = matrix[start:stop]
+        product = rows @ right
+        out[start:stop] = product.toarray() if sparse.issparse(product) else product
+    out *= np.asarray(scales).reshape((n,) + (1,) * (out.ndim - 1))
+    return out
+
+
+def similarity_block(vectors, rows, scales=None):
+    """Dense cosine similarities of some rows against every row
+
+    int8 vectors are multiplied in float32 chunks and rescaled, since an
+    int8 sparse product would overflow.
+    """
+    if scales is None:
+        return (vectors[rows] @ vectors.T).toarray()
+    queries = dequantize(vectors[rows], scales[rows])
+    return np.ascontiguousarray(scaled_product(vectors, queries.T, scales).T)
+
+
+def block_rows(n):
+    """Number of rows scored at once so a block stays within BLOCK_CELLS"""
+    return max(1, BLOCK_CELLS // max(n, 1))
+
+
+def exact_neighbors(vectors, indices, k, scales=None):
+    """Exact top-k neighbors of the given rows of normalized vectors
+
+    Rows are scored a block at a time with one sparse matrix product per
+    block; `scales` are the row scales of int8 vectors. Returns
+    (len(indices), k) arrays of row positions (int32) and cosine
+    similarities (float64 for float64 vectors, else float32), best first.
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    n = vectors.shape[0]
+    k = max(min(k, n - 1), 0)
+    neighbor_ids = np.empty((len(indices), k), dtype=np.int32)
+    neighbor_scores = np.empty((len(indices), k), dtype=np.float64 if vectors.dtype == np.float64 else np.float32)
+    if k == 0:
+        return neighbor_ids, neighbor_scores
+
+    step = block_rows(n)
+    for start in range(0, len(indices), step):
+        stop = min(start + step, len(indices))
+        chunk = indices[start:stop]
+        block = similarity_block(vectors, chunk, scales)
+
+        # A movie is never its own recommendation
+        block[np.arange(len(chunk)), chunk] = -np.inf
+
+        neighbor_ids[start:stop], neighbor_scores[start:stop] = top_k(block, k)
+
+    return neighbor_ids, neighbor_scores
+
+
+def build_neighbor_index(vectors, k=NEIGHBORS_K, scales=None):
+    """Build a top-K neighbor index from normalized movie vectors
+
+    Returns two (n_movies, k) arrays: the row positions of each movie's most
+    similar movies (int32) and their cosine similarities, best first.
+    Similarities are computed a block of rows at a time, so memory grows with
+    the number of movies instead of its square.
+    """
+    return exact_neighbors(vectors, np.arange(vectors.shape[0]), k, scales)
+
+
+def update_neighbor_index(vectors, neighbor_ids, neighbor_scores, changed, scales=None):
+    """Refresh a top-K index after some movies were added or changed
+
+    `vectors` are the normalized vectors after the change and `changed` the
+    positions of new or modified rows (new rows come after the old index).
+    Changed rows and rows that listed a changed movie are recomputed; every
+    other row only merges in the changed movies that beat its current K-th
+    score. The cost grows with the size of the change, not the catalog.
+    `scales` are the row scales of int8 vectors.
+    """
+    n = vectors.shape[0]
+    n_old, k = neighbor_ids.shape
+    changed = np.unique(np.asarray(changed, dtype=np.intp))
+
+    # An index that listed every movie keeps doing so as the catalog grows
+    if k == n_old - 1:
+        k = max(min(NEIGHBORS_K, n - 1), 0)
+
+    ids = np.full((n, k), -1, dtype=np.int32)
+    scores = np.full((n, k), -np.inf, dtype=neighbor_scores.dtype)
+    width = min(k, neighbor_ids.shape[1])
+    ids[:n_old, :width] = neighbor_ids[:, :width]
+    scores[:n_old, :width] = neighbor_scores[:, :width]
+    if k == 0 or not len(changed):
+        return ids, scores
+
+    is_changed = np.zeros(n, dtype=bool)
+    is_changed[changed] = True
+    stale = np.zeros(n, dtype=bool)
+    stale[:n_old] = np.isin(neighbor_ids, changed).any(axis=1)
+    stale &= ~is_changed
+    untouched = np.flatnonzero(~is_changed & ~stale)
+
+    step = block_rows(n)
+    for start in range(0, len(changed), step):
+        chunk = changed[start:start + step]
+        block = similarity_block(vectors, chunk, scales)
+        block[np.arange(len(chunk)), chunk] = -np.inf
+        ids[chunk], scores[chunk] = top_k(block, k)
+
+        # Merge the changed movies into lists whose K-th score they beat
+        candidates = block.T[untouched]
+        rows = untouched[candidates.max(axis=1) > scores[untouched, -1]]
+        if len(rows):
+            merged_ids = np.hstack([ids[rows], np.broadcast_to(chunk, (len(rows), len(chunk)))])
+            merged_scores = np.hstack([scores[rows], block.T[rows]])
+            top, scores[rows] = top_k(merged_scores, k)
+            ids[rows] = np.take_along_axis(merged_ids, top, axis=1)
+
+    stale = np.flatnonzero(stale)
+    ids[stale], scores[stale] = exact_neighbors(vectors, stale, k, scales)
+    return ids, scores
+
+
+def vectors_from_arrays(arrays):
+    """CSR matrix from the vectors_* arrays of an artifact, without copying"""
+    return sparse.csr_matrix(
+        (arrays['vectors_data'], arrays['vectors_indices'], arrays['vectors_indptr']),
+        shape=tuple(arrays['vectors_shape']),
+    )
+
+
+def precision_from_arrays(arrays):
+    """Precision of the vectors stored in artifact arrays"""
+    return 'int8' if 'vectors_scales' in arrays else str(arrays['vectors_data'].dtype)
+
+
+class SparseEngine:
+    """Scores one movie against the whole catalog at request time
+
+    Keeps only the L2-normalized sparse movie vectors; a similarity row is a
+    single sparse matrix-vector product, so nothing N x N is ever stored.
+    Vector values are stored at `precision`; int8 vectors carry one scale
+    per row in `scales`, applied to every score.
+    """
+
+    name = 'sparse'
+
+    def __init__(self, vectors, normalized=False, precision=VECTOR_PRECISION, scales=None):
+        if scales is None:
+            vectors = sparse.csr_matrix(vectors, dtype=np.float64 if precision == 'float64' else np.float32)
+            vectors, scales = quantize(vectors if normalized else normalize(vectors), precision)
+        self.vectors = vectors
+        self.scales = scales
+        self.precision = precision
+
+    def float_vectors(self):
+        """Normalized vectors as a float CSR matrix, dequantizing int8 values"""
+        return dequantize(self.vectors, self.scales)
+
+    def to_arrays(self):
+        """Arrays needed to rebuild the engine from an artifact"""
+        arrays = {
+            'vectors_data': self.vectors.data,
+            'vectors_indices': self.vectors.indices,
+            'vectors_indptr': self.vectors.indptr,
+            'vectors_shape': np.array(self.vectors.shape, dtype=np.int64),
+        }
+        if self.scales is not None:
+            arrays['vectors_scales'] = self.scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild the engine from (possibly memory-mapped) artifact arrays"""
+        return cls(vectors_from_arrays(arrays), normalized=True,
+                   precision=precision_from_arrays(arrays), scales=arrays.get('vectors_scales'))
+
+    def update(self, vectors, changed):
+        """New engine over updated normalized float vectors; `changed` rows differ"""
+        return SparseEngine(vectors, normalized=True, precision=self.precision)
+
+    def query_vector(self, index):
+        """Dense normalized vector of one movie"""
+        query = self.vectors[index].toarray().ravel()
+        return query if self.scales is None else query * self.scales[index]
+
+    def score(self, query, rows=None):
+        """Cosine similarity of a dense query vector against every movie, or some rows"""
+        if rows is None:
+            return scaled_product(self.vectors, query, self.scales)
+        return scaled_product(self.vectors[rows], query, None if self.scales is None else self.scales[rows])
+
+    def scores(self, index):
+        """Cosine similarity of one movie against every movie"""
+        return self.score(self.query_vector(index))
+
+    def score_sparse(self, query):
+        """Cosine similarity of a normalized sparse query row against every movie
+
+        Multiplies sparse by sparse, so only the query's terms are touched and
+        the vocabulary is never densified.
+        """
+        return scaled_product(self.vectors, query.T.astype(np.float32), self.scales).ravel()
+
+    def text_neighbors(self, query, k=10):
+        """Row positions and scores of the k movies most similar to a sparse query row
+
+        Movies sharing no term with the query are never returned.
+        """
+        ids, top_scores = top_k(self.score_sparse(query), k)
+        found = top_scores[0] > 0
+        return ids[0][found], top_scores[0][found]
+
+    def neighbors(self, index, k=5, allowed=None, prior=None, weight=0.0):
+        """Return the row positions and scores of the k most similar movies
+
+        `allowed`, `prior` and `weight` filter and re-rank the scores with
+        rank_scores() before the top k are selected, so fewer than k movies
+        come back only when fewer are allowed.
+        """
+        scores = rank_scores(self.scores(index), allowed, prior, weight)
+        scores[index] = -np.inf
+        ids, top_scores = top_k(scores, min(k, len(scores) - 1))
+        found = np.isfinite(top_scores[0])
+        return ids[0][found], top_scores[0][found]
+
+    def neighbors_batch(self, indices, k=5):
+        """Return (len(indices), k) arrays of neighbor positions and scores
+
+        Scores all requested movies with one sparse matrix product per block
+        of rows instead of one product per movie.
+        """
+        return exact_neighbors(self.vectors, indices, k, self.scales)
+
+    def profile(self, indices, weights=None, k=5):
+        """Top k movies for a weighted set of seed movies, seeds excluded
+
+        The seeds' vectors are summed (weighted) into one query vector and
+        the catalog is scored against it with a single sparse product, so
+        the cost barely depends on the number of seeds.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        weights = np.ones(len(indices), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+
+        seeds = dequantize(self.vectors[indices], None if self.scales is None else self.scales[indices])
+        query = sparse.csr_matrix(weights.reshape(1, -1)) @ seeds
+        scores = self.score(query.toarray().ravel())
+        scores[indices] = -np.inf
+
+        ids, top_scores = top_k(scores, k)
+        found = np.isfinite(top_scores[0])
+        return ids[0][found], top_scores[0][found]
+
+
+class NeighborIndexEngine(SparseEngine):
+    """Serves recommendations from a precomputed top-K neighbor index
+
+    The sparse vectors are kept alongside the index so it can be updated
+    incrementally when movies are added or changed. Neighbor scores are
+    stored at the same precision as the vectors, int8 with one scale per row.
+    """
+
+    name = 'topk'
+
+    def __init__(self, vectors, neighbor_ids=None, neighbor_scores=None, normalized=False,
+                 precision=VECTOR_PRECISION, scales=None, score_scales=None):
+        super().__init__(vectors, normalized, precision, scales)
+        if neighbor_ids is None:
+            neighbor_ids, neighbor_scores = build_neighbor_index(self.vectors, scales=self.scales)
+        if precision == 'int8' and score_scales is None:
+            rows = np.repeat(np.arange(len(neighbor_scores)), neighbor_scores.shape[1])
+            neighbor_scores, score_scales = quantize_rows(neighbor_scores.ravel(), rows, len(neighbor_scores))
+            neighbor_scores = neighbor_scores.reshape(neighbor_ids.shape)
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+        self.score_scales = score_scales
+
+    def to_arrays(self):
+        """Arrays needed to rebuild the engine from an artifact"""
+        arrays = {
+            **super().to_arrays(),
+            'neighbor_ids': self.neighbor_ids,
+            'neighbor_scores': self.neighbor_scores,
+        }
+        if self.score_scales is not None:
+            arrays['neighbor_score_scales'] = self.score_scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild the engine from (possibly memory-mapped) artifact arrays"""
+        return cls(vectors_from_arrays(arrays), arrays['neighbor_ids'], arrays['neighbor_scores'], normalized=True,
+                   precision=precision_from_arrays(arrays), scales=arrays.get('vectors_scales'),
+                   score_scales=arrays.get('neighbor_score_scales'))
+
+    def neighbor_score_rows(self, indices, k):
+        """Float neighbor scores of some rows, dequantizing int8 scores"""
+        scores = self.neighbor_scores[indices, :k]
+        if self.score_scales is None:
+            return scores
+        return scores * np.asarray(self.score_scales[indices])[..., None]
+
+    def update(self, vectors, changed):
+        """New engine over updated normalized float vectors; `changed` rows differ"""
+        updated = SparseEngine(vectors, normalized=True, precision=self.precision)
+        all_rows = np.arange(len(self.neighbor_ids))
+        neighbor_ids, neighbor_scores = update_neighbor_index(
+            updated.vectors, self.neighbor_ids, self.neighbor_score_rows(all_rows, self.neighbor_ids.shape[1]),
+            changed, updated.scales,
+        )
+        return NeighborIndexEngine(updated.vectors, neighbor_ids, neighbor_scores, normalized=True,
+                                   precision=self.precision, scales=updated.scales)
+
+    def neighbors(self, index, k=5, allowed=None, prior=None, weight=0.0):
+        """Return the row positions and scores of the k most similar movies
+
+        Filtered or re-ranked queries score every movie exactly, since the
+        stored top K may not hold k allowed movies.
+        """
+        if allowed is not None or (weight and prior is not None):
+            return super().neighbors(index, k, allowed, prior, weight)
+        return self.neighbor_ids[index, :k], self.neighbor_score_rows(index, k)
+
+    def neighbors_batch(self, indices, k=5):
+        """Return (len(indices), k) arrays of neighbor positions and scores"""
+        indices = np.asarray(indices, dtype=np.intp)
+        return self.neighbor_ids[indices, :k], self.neighbor_score_rows(indices, k)
+
+
+class LSHEngine(SparseEngine):
+    """Approximate nearest neighbors with random-projection LSH
+
+    Each of `tables` hash tables signs the projection of a vector onto `bits`
+    random hyperplanes, so similar movies tend to share buckets. A query
+    collects the movies in its bucket of every table (plus the buckets one
+    bit away when probes=1) and scores only those exactly.
+    """
+
+    name = 'lsh'
+
+    def __init__(self, vectors, tables=LSH_TABLES, bits=LSH_BITS, probes=LSH_PROBES,
+                 normalized=False, planes=None, order=None, sorted_codes=None,
+                 precision=VECTOR_PRECISION, scales=None):
+        super().__init__(vectors, normalized, precision, scales)
+        if not 1 <= bits <= 32:
+            raise ValueError("LSH bits per table must be between 1 and 32")
+        self.tables, self.bits, self.probes = tables, bits, probes
+
+        if planes is None:
+            rng = np.random.default_rng(LSH_SEED)
+            planes = rng.standard_normal((self.vectors.shape[1], tables * bits)).astype(np.float32)
+            codes = np.vstack([
+                self.hash(self.vectors[start:start + block_rows(tables * bits)], planes)
+                for start in range(0, self.vectors.shape[0], block_rows(tables * bits))
+            ]) if self.vectors.shape[0] else np.empty((0, tables), dtype=np.uint32)
+            order = np.argsort(codes, axis=0, kind='stable').T.astype(np.int32)
+            sorted_codes = np.take_along_axis(codes.T, order, axis=1)
+
+        self.planes = planes
+        self.order = order
+        self.sorted_codes = sorted_codes
+
+    def hash(self, vectors, planes=None):
+        """(rows, tables) uint32 bucket codes for normalized vectors
+
+        Only the signs of the projections matter, so positive row scales of
+        int8 vectors can be ignored.
+        """
+        planes = self.planes if planes is None else planes
+        signs = np.asarray(vectors.astype(np.float32) @ planes) > 0
+        weights = np.left_shift(np.uint32(1), np.arange(self.bits, dtype=np.uint32))
+        return signs.reshape(len(signs), self.tables, self.bits) @ weights
+
+    def to_arrays(self):
+        """Arrays needed to rebuild the engine from an artifact"""
+        return {
+            **super().to_arrays(),
+            'lsh_params': np.array([self.tables, self.bits, self.probes], dtype=np.int64),
+            'lsh_planes': self.planes,
+            'lsh_order': self.order,
+            'lsh_sorted_codes': self.sorted_codes,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild the engine from (possibly memory-mapped) artifact arrays"""
+        tables, bits, probes = arrays['lsh_params'].tolist()
+        return cls(vectors_from_arrays(arrays), tables, bits, probes, normalized=True,
+                   planes=arrays['lsh_planes'], order=arrays['lsh_order'],
+                   sorted_codes=arrays['lsh_sorted_codes'],
+                   precision=precision_from_arrays(arrays), scales=arrays.get('vectors_scales'))
+
+    def update(self, vectors, changed):
+        """New engine over updated normalized float vectors, rehashing every row"""
+        return LSHEngine(vectors, self.tables, self.bits, self.probes, normalized=True, precision=self.precision)
+
+    def candidates(self, query):
+        """Row positions sharing a (probed) bucket with a normalized query"""
+        codes = self.hash(query)[0]
+        flips = np.left_shift(np.uint32(1), np.arange(self.bits, dtype=np.uint32))
+
+        found = []
+        for table, code in enumerate(codes):
+            probes = np.concatenate([[code], code ^ flips]) if self.probes else np.array([code])
+            left = np.searchsorted(self.sorted_codes[table], probes, side='left')
+            right = np.searchsorted(self.sorted_codes[table], probes, side='right')
+            found.extend(self.order[table, a:b] for a, b in zip(left, right) if b > a)
+
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int32)
+
+    def neighbors(self, index, k=5, allowed=None, prior=None, weight=0.0):
+        """Return the row positions and scores of the approximately k most similar movies
+
+        Falls back to exact scoring when fewer than k candidates are allowed.
+        """
+        candidates = self.candidates(self.vectors[index])
+        candidates = candidates[candidates != index]
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        if len(candidates) < k:
+            return super().neighbors(index, k, allowed, prior, weight)
+
+        scores = rank_scores(self.score(self.query_vector(index), candidates), prior=prior, weight=weight, rows=candidates)
+        top, top_scores = top_k(scores, k)
+        return candidates[top[0]].astype(np.int32), top_scores[0]
+
+    def neighbors_batch(self, indices, k=5):
+        """Return (len(indices), k) arrays of neighbor positions and scores"""
+        k = max(min(k, self.vectors.shape[0] - 1), 0)
+        neighbor_ids = np.empty((len(indices), k), dtype=np.int32)
+        neighbor_scores = np.empty((len(indices), k), dtype=np.float64 if self.precision == 'float64' else np.float32)
+        for row, index in enumerate(indices):
+            neighbor_ids[row], neighbor_scores[row] = self.neighbors(index, k)
+        return neighbor_ids, neighbor_scores
+
+
+class EmbeddingEngine(SparseEngine):
+    """Scores dense low-rank embeddings from a randomized truncated SVD
+
+    The sparse tag vectors are projected onto `dimensions` SVD components
+    and L2-normalized, so a similarity row is one dense matrix-vector
+    product over a few hundred columns. The sparse vectors and components
+    are kept so text queries and updated movies can be projected the same
+    way without refitting.
+    """
+
+    name = 'svd'
+
+    def __init__(self, vectors, dimensions=SVD_DIMENSIONS, normalized=False, components=None,
+                 embeddings=None, precision=VECTOR_PRECISION, scales=None, embedding_scales=None):
+        super().__init__(vectors, normalized, precision, scales)
+        if components is None:
+            dimensions = max(1, min(dimensions, min(self.vectors.shape) - 1))
+            svd = TruncatedSVD(n_components=dimensions, algorithm='randomized', random_state=SVD_SEED)
+            svd.fit(self.float_vectors())
+            components = svd.components_.astype(np.float32)
+        if embeddings is None:
+            embeddings, embedding_scales = quantize_dense(self.project(self.float_vectors(), components), precision)
+        self.components = components
+        self.embeddings = embeddings
+        self.embedding_scales = embedding_scales
+
+    @staticmethod
+    def project(vectors, components):
+        """L2-normalized dense embeddings of sparse rows"""
+        return normalize(np.asarray(vectors @ components.T, dtype=np.float32))
+
+    def to_arrays(self):
+        """Arrays needed to rebuild the engine from an artifact"""
+        arrays = {
+            **super().to_arrays(),
+            'svd_components': self.components,
+            'svd_embeddings': self.embeddings,
+        }
+        if self.embedding_scales is not None:
+            arrays['svd_embedding_scales'] = self.embedding_scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild the engine from (possibly memory-mapped) artifact arrays"""
+        return cls(vectors_from_arrays(arrays), normalized=True, components=arrays['svd_components'],
+                   embeddings=arrays['svd_embeddings'], precision=precision_from_arrays(arrays),
+                   scales=arrays.get('vectors_scales'), embedding_scales=arrays.get('svd_embedding_scales'))
+
+    def update(self, vectors, changed):
+        """New engine over updated normalized float vectors, projected onto the same components"""
+        return EmbeddingEngine(vectors, normalized=True, components=self.components, precision=self.precision)
+
+    def embedding_rows(self, rows):
+        """Float embeddings of some rows, dequantizing int8 values"""
+        embeddings = self.embeddings[rows]
+        if self.embedding_scales is None:
+            return embeddings
+        return embeddings.astype(np.float32) * np.asarray(self.embedding_scales[rows])[..., None]
+
+    def query_vector(self, index):
+        """Embedding of one movie"""
+        return self.embedding_rows(index)
+
+    def score(self, query, rows=None):
+        """Cosine similarity of an embedding against every movie, or some rows"""
+        if rows is None:
+            return scaled_product(self.embeddings, query, self.embedding_scales)
+        scales = None if self.embedding_scales is None else self.embedding_scales[rows]
+        return scaled_product(self.embeddings[rows], query, scales)
+
+    def score_sparse(self, query):
+        """Cosine similarity of a normalized sparse query row, projected onto the components"""
+        return self.score(self.project(query, self.components)[0])
+
+    def neighbors_batch(self, indices, k=5):
+        """Return (len(indices), k) arrays of neighbor positions and scores
+
+        Scores a block of movies with one dense matrix product at a time.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        n = self.embeddings.shape[0]
+        k = max(min(k, n - 1), 0)
+        neighbor_ids = np.empty((len(indices), k), dtype=np.int32)
+        neighbor_scores = np.empty((len(indices), k), dtype=np.float64 if self.precision == 'float64' else np.float32)
+        if k == 0:
+            return neighbor_ids, neighbor_scores
+
+        step = block_rows(n)
+        for start in range(0, len(indices), step):
+            chunk = indices[start:start + step]
+            block = scaled_product(self.embeddings, self.embedding_rows(chunk).T, self.embedding_scales).T
+            block[np.arange(len(chunk)), chunk] = -np.inf
+            neighbor_ids[start:start + step], neighbor_scores[start:start + step] = top_k(block, k)
+        return neighbor_ids, neighbor_scores
+
+    def profile(self, indices, weights=None, k=5):
+        """Top k movies for a weighted set of seed movies, seeds excluded"""
+        indices = np.asarray(indices, dtype=np.intp)
+        weights = np.ones(len(indices), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+
+        scores = self.score(weights @ self.embedding_rows(indices))
+        scores[indices] = -np.inf
+        ids, top_scores = top_k(scores, k)
+        found = np.isfinite(top_scores[0])
+        return ids[0][found], top_scores[0][found]
+
+
+ENGINES = {engine.name: engine for engine in (SparseEngine, NeighborIndexEngine, LSHEngine, EmbeddingEngine)}
+
+
+def build_engine(vectors, mode=ENGINE, precision=VECTOR_PRECISION):
+    """Create the similarity engine selected by RECOMMENDER_ENGINE"""
+    if mode not in ENGINES:
+        raise ValueError(f"Unknown recommender engine: {mode}")
+    if precision == 'int8' and mode not in INT8_ENGINES:
+        raise ValueError(f"int8 precision is only supported by the {', '.join(INT8_ENGINES)} engine, not {mode}")
+    return ENGINES[mode](vectors, precision=precision)
+
+
+def load_engine(mode, arrays):
+    """Rebuild a saved engine from its artifact arrays"""
+    if mode not in ENGINES:
+        raise ValueError(f"Unknown recommender engine: {mode}")
+    return ENGINES[mode].from_arrays(arrays)
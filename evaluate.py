@@ -0,0 +1,213 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from artifact import ARTIFACT_DIR, load_model
+from engine import ENGINES, PRECISIONS, SVD_DIMENSIONS, EmbeddingEngine, LSHEngine, SparseEngine
+
+
+def recall_at_k(approximate_ids, exact_ids):
+    """Mean fraction of the exact top-k that the approximate top-k found"""
+    hits = [len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approximate_ids.tolist(), exact_ids.tolist())]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def sample_queries(n_movies, queries, seed=0):
+    """Fixed random sample of row positions to evaluate"""
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n_movies, size=min(queries, n_movies), replace=False))
+
+
+def query_costs(engine, sample, k, traced=50):
+    """Neighbors of each sampled movie, mean query latency in ms and mean MB allocated per query
+
+    Allocation is the peak of memory allocated during a query, traced over
+    the first `traced` queries only since tracing slows every call down.
+    """
+    start = time.perf_counter()
+    ids = np.array([engine.neighbors(index, k)[0] for index in sample])
+    query_ms = (time.perf_counter() - start) * 1000 / max(len(sample), 1)
+
+    allocated = []
+    tracemalloc.start()
+    for index in sample[:traced]:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        engine.neighbors(index, k)
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return ids, query_ms, float(np.mean(allocated)) / 2 ** 20 if allocated else 0.0
+
+
+def lsh_report(vectors, settings, k=10, queries=500):
+    """Recall@k and query latency of LSH settings against exact search
+
+    `settings` is a list of (tables, bits, probes) tuples. Both engines
+    are timed one query at a time, the way the server calls them.
+    """
+    sample = sample_queries(vectors.shape[0], queries)
+    exact = SparseEngine(vectors, normalized=True, precision=str(vectors.dtype))
+
+    start = time.perf_counter()
+    exact_ids = np.array([exact.neighbors(index, k)[0] for index in sample])
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(sample), 1)
+
+    rows = []
+    for tables, bits, probes in settings:
+        start = time.perf_counter()
+        engine = LSHEngine(vectors, tables, bits, probes, normalized=True)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ann_ids, _ = engine.neighbors_batch(sample, k)
+        query_ms = (time.perf_counter() - start) * 1000 / max(len(sample), 1)
+
+        rows.append({
+            'tables': tables,
+            'bits': bits,
+            'probes': probes,
+            'recall_at_k': recall_at_k(ann_ids, exact_ids),
+            'query_ms': query_ms,
+            'exact_query_ms': exact_ms,
+            'build_s': build_s,
+        })
+    return rows
+
+
+def precision_report(vectors, precisions, k=10, queries=500, mode='sparse'):
+    """Top-k overlap, size, query latency and per-query allocation of each precision against float64
+
+    The float64 reference scores every sampled movie exactly; each
+    precision is built with the given engine mode, including int8 for
+    engines that do not offer it in production.
+    """
+    sample = sample_queries(vectors.shape[0], queries)
+    reference = SparseEngine(vectors, precision='float64')
+    exact_ids, _ = reference.neighbors_batch(sample, k)
+    reference_bytes = sum(array.nbytes for array in ENGINES[mode](vectors, precision='float64').to_arrays().values())
+
+    rows = []
+    for precision in precisions:
+        start = time.perf_counter()
+        engine = ENGINES[mode](vectors, precision=precision)
+        build_s = time.perf_counter() - start
+        stored_bytes = sum(array.nbytes for array in engine.to_arrays().values())
+        ids, query_ms, query_mb = query_costs(engine, sample, k)
+
+        rows.append({
+            'precision': precision,
+            'overlap_at_k': recall_at_k(ids, exact_ids),
+            'stored_mb': stored_bytes / 2 ** 20,
+            'size_ratio': reference_bytes / stored_bytes,
+            'query_ms': query_ms,
+            'query_alloc_mb': query_mb,
+            'build_s': build_s,
+        })
+    return rows
+
+
+def svd_report(vectors, dimensions, k=10, queries=500, precision='float32'):
+    """Top-k overlap, scoring memory and query latency of SVD embeddings against the sparse engine
+
+    The first row is the sparse raw-count engine the others are compared
+    with. Scoring memory counts the arrays a query reads: the sparse
+    vectors for the baseline, the embeddings and components for SVD.
+    """
+    sample = sample_queries(vectors.shape[0], queries)
+    baseline = SparseEngine(vectors, normalized=True, precision=precision)
+    exact_ids, _ = baseline.neighbors_batch(sample, k)
+
+    def timed_queries(engine):
+        start = time.perf_counter()
+        ids = np.array([engine.neighbors(index, k)[0] for index in sample])
+        return ids, (time.perf_counter() - start) * 1000 / max(len(sample), 1)
+
+    _, baseline_ms = timed_queries(baseline)
+    rows = [{
+        'engine': 'sparse',
+        'dimensions': vectors.shape[1],
+        'overlap_at_k': 1.0,
+        'scoring_mb': sum(array.nbytes for array in baseline.to_arrays().values()) / 2 ** 20,
+        'query_ms': baseline_ms,
+        'speedup': 1.0,
+        'build_s': 0.0,
+    }]
+    for width in dimensions:
+        start = time.perf_counter()
+        engine = EmbeddingEngine(vectors, width, normalized=True, precision=precision)
+        build_s = time.perf_counter() - start
+
+        ids, query_ms = timed_queries(engine)
+        scoring_bytes = engine.embeddings.nbytes + engine.components.nbytes
+        if engine.embedding_scales is not None:
+            scoring_bytes += engine.embedding_scales.nbytes
+        rows.append({
+            'engine': 'svd',
+            'dimensions': engine.embeddings.shape[1],
+            'overlap_at_k': recall_at_k(ids, exact_ids),
+            'scoring_mb': scoring_bytes / 2 ** 20,
+            'query_ms': query_ms,
+            'speedup': baseline_ms / query_ms if query_ms else 0.0,
+            'build_s': build_s,
+        })
+    return rows
+
+
+def print_rows(rows):
+    """Print report rows as an aligned table"""
+    if not rows:
+        return
+    columns = list(rows[0])
+    print('  '.join(f'{column:>14}' for column in columns))
+    for row in rows:
+        print('  '.join(
+            f'{value:>14.4f}' if isinstance(value, float) else f'{value:>14}'
+            for value in row.values()
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate recommendation engines against exact search")
+    parser.add_argument('--artifact-dir', default=ARTIFACT_DIR, help="artifact directory with the vectors to use")
+    parser.add_argument('-k', type=int, default=10, help="neighbors per query")
+    parser.add_argument('--queries', type=int, default=500, help="number of sampled query movies")
+    parser.add_argument('--json', help="also write the results to this file")
+    subparsers = parser.add_subparsers(dest='report', required=True)
+
+    lsh = subparsers.add_parser('lsh', help="recall@k of LSH settings")
+    lsh.add_argument('--tables', type=int, nargs='+', default=[8, 16, 32])
+    lsh.add_argument('--bits', type=int, nargs='+', default=[8, 10, 12, 14])
+    lsh.add_argument('--probes', type=int, nargs='+', default=[0, 1])
+
+    precision = subparsers.add_parser('precision', help="top-k overlap of reduced precisions against float64")
+    precision.add_argument('--precisions', nargs='+', default=list(PRECISIONS), choices=list(PRECISIONS))
+    precision.add_argument('--engine', default='sparse', choices=list(ENGINES),
+                           help="engine mode to build at each precision")
+
+    svd = subparsers.add_parser('svd', help="top-k overlap and speed of SVD embeddings against the sparse engine")
+    svd.add_argument('--dimensions', type=int, nargs='+', default=[100, SVD_DIMENSIONS, 300])
+    svd.add_argument('--precision', default='float32', choices=list(PRECISIONS))
+
+    args = parser.parse_args()
+    _, _, _, engine = load_model(root=args.artifact_dir)
+    vectors = engine.float_vectors()
+
+    if args.report == 'lsh':
+        settings = [(t, b, p) for t in args.tables for b in args.bits for p in args.probes]
+        rows = lsh_report(vectors, settings, args.k, args.queries)
+    elif args.report == 'precision':
+        rows = precision_report(vectors, args.precisions, args.k, args.queries, args.engine)
+    elif args.report == 'svd':
+        rows = svd_report(vectors, sorted(set(args.dimensions)), args.k, args.queries, args.precision)
+
+    print_rows(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import numpy as np
+
+from ingest import GENRE_SEPARATOR
+
+
+class CatalogFilter:
+    """Per-genre bitmaps and numeric columns used to filter and re-rank recommendations
+
+    Built once per catalog and stored with its artifact generation. Every
+    filter is a vectorized boolean mask over all movies, so a filtered query
+    scores the catalog the same way as an unfiltered one and only the top-k
+    selection sees the mask.
+    """
+
+    def __init__(self, genres, popularity, vote_count):
+        genre_lists = [value.split(GENRE_SEPARATOR) if value else [] for value in genres]
+        names = sorted({name for names in genre_lists for name in names})
+        self.genre_ids = {name.lower(): position for position, name in enumerate(names)}
+        self.genre_names = names
+
+        # One boolean bitmap per genre, stored as rows of a (genres, movies) array
+        self.bitmaps = np.zeros((len(names), len(genre_lists)), dtype=bool)
+        for movie, names in enumerate(genre_lists):
+            self.bitmaps[[self.genre_ids[name.lower()] for name in names], movie] = True
+
+        self.vote_count = np.asarray(vote_count, dtype=np.int64)
+
+        # Popularity on a log scale mapped to [0, 1], comparable with cosine similarity
+        popularity = np.log1p(np.clip(np.asarray(popularity, dtype=np.float32), 0, None))
+        top = popularity.max() if len(popularity) else 0
+        self.popularity = popularity / top if top > 0 else np.zeros_like(popularity)
+
+    def to_arrays(self):
+        """Arrays storing the filter; vote counts are stored with the catalog"""
+        return {
+            'filter_genre_names': np.array(self.genre_names, dtype=str),
+            'filter_bitmaps': self.bitmaps,
+            'filter_popularity': self.popularity,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Filter stored by to_arrays(), reading the (memory-mapped) arrays in place"""
+        catalog_filter = cls.__new__(cls)
+        catalog_filter.genre_names = arrays['filter_genre_names'].tolist()
+        catalog_filter.genre_ids = {name.lower(): position for position, name in enumerate(catalog_filter.genre_names)}
+        catalog_filter.bitmaps = arrays['filter_bitmaps']
+        catalog_filter.vote_count = arrays['vote_count']
+        catalog_filter.popularity = arrays['filter_popularity']
+        return catalog_filter
+
+    def genre_rows(self, genres):
+        """Bitmap rows of genre names, matched case-insensitively; ValueError if unknown"""
+        unknown = [genre for genre in genres if genre.lower() not in self.genre_ids]
+        if unknown:
+            raise ValueError(f"unknown genres {unknown}; choose from {self.genre_names}")
+        return [self.genre_ids[genre.lower()] for genre in genres]
+
+    def genre_mask(self, genres):
+        """Movies having any of the given genres"""
+        return self.bitmaps[self.genre_rows(genres)].any(axis=0)
+
+    def mask(self, include=(), exclude=(), min_votes=0):
+        """Boolean mask of movies that may be recommended, or None if nothing is filtered
+
+        `include` keeps movies with any of those genres, `exclude` drops
+        movies with any of those genres and `min_votes` drops movies with
+        fewer votes.
+        """
+        allowed = None
+        if include:
+            allowed = self.genre_mask(include)
+        if exclude:
+            excluded = ~self.genre_mask(exclude)
+            allowed = excluded if allowed is None else allowed & excluded
+        if min_votes > 0:
+            voted = self.vote_count >= min_votes
+            allowed = voted if allowed is None else allowed & voted
+        return allowed
+
+
+def parse_filter_args(args, catalog_filter=None):
+    """Filter and blend parameters from query arguments
+
+    Reads comma-separated `genres` and `exclude_genres`, `min_votes` and
+    `popularity_weight` (between 0 and 1). Genre names are lower-cased and
+    sorted so equivalent requests share a cache key, and checked against
+    catalog_filter when given. Raises ValueError for invalid values.
+    """
+    def names(key):
+        return tuple(sorted({name.strip().lower() for name in args.get(key, '').split(',') if name.strip()}))
+
+    try:
+        min_votes = int(args.get('min_votes', 0))
+        popularity_weight = float(args.get('popularity_weight', 0))
+    except ValueError:
+        raise ValueError("min_votes must be an integer and popularity_weight a number")
+    if not 0 <= popularity_weight <= 1:
+        raise ValueError("popularity_weight must be between 0 and 1")
+
+    filters = {
+        'include': names('genres'),
+        'exclude': names('exclude_genres'),
+        'min_votes': min_votes,
+        'popularity_weight': popularity_weight,
+    }
+    if catalog_filter is not None:
+        catalog_filter.genre_rows(filters['include'] + filters['exclude'])
+    return filters
@@ -0,0 +1,49 @@
+# Gunicorn settings, picked up automatically from the working directory
+import os
+
+from metrics import clear_multiproc_dir, mark_process_dead, republish
+
+# By default each worker binds right away and loads the model in the
+# background, answering /health meanwhile. GUNICORN_PRELOAD=1 loads it once
+# in the master instead, so workers share its memory copy-on-write, but
+# nothing answers until that load finishes
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+# Keep workers that are still loading in the background from being killed
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+
+def on_starting(server):
+    """Start every run with empty multiprocess metric files"""
+    clear_multiproc_dir()
+
+
+def when_ready(server):
+    """With preload_app, finish loading the model before any worker forks
+
+    If that load fails, the workers' artifact watchers retry it.
+    """
+    if server.cfg.preload_app:
+        import app_production
+        app_production.start_loading(background=False)
+
+
+def post_worker_init(worker):
+    """Without preload_app, each worker loads the model in a background thread
+
+    With preload_app the model gauges set in the master are published
+    again under the worker's pid. Every worker also watches for new
+    artifact generations and reloads on SIGHUP; the master does neither.
+    Gunicorn resets worker signal handlers, so the handler is installed
+    after worker init.
+    """
+    import app_production
+    republish()
+    app_production.start_loading()
+    app_production.start_watching()
+    app_production.install_reload_signal()
+
+
+def child_exit(server, worker):
+    """Stop reporting the live gauges of a worker that exited"""
+    mark_process_dead(worker.pid)
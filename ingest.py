@@ -0,0 +1,185 @@
+import ast
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional, the standard library parser also works
+    _loads = json.loads
+
+# Directory holding tmdb_5000_movies.csv and tmdb_5000_credits.csv
+DATA_DIR = os.environ.get('TMDB_DATA_DIR', os.path.join(os.path.expanduser('~'), 'OneDrive', 'Desktop'))
+
+# Worker processes and rows per task used to parse the TMDB list columns
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', os.cpu_count() or 1))
+CHUNK_ROWS = 1000
+
+# Columns holding JSON lists of objects, in the order they are parsed
+LIST_COLUMNS = ['genres', 'keywords', 'cast', 'crew']
+
+# Columns kept from the merged movies and credits datasets
+COLUMNS = ['genres', 'title', 'overview', 'keywords', 'popularity', 'vote_count', 'id', 'cast', 'crew']
+
+# Per-movie columns kept next to the tags in the processed catalog
+CATALOG_COLUMNS = ['id', 'title', 'popularity', 'vote_count', 'genres']
+
+# Separator between genre names in the catalog's genres column
+GENRE_SEPARATOR = '|'
+
+
+def tmdb_paths(data_dir=DATA_DIR):
+    """Paths of the TMDB movies and credits CSVs in a data directory"""
+    return (
+        os.path.join(data_dir, 'tmdb_5000_movies.csv'),
+        os.path.join(data_dir, 'tmdb_5000_credits.csv'),
+    )
+
+
+def read_tmdb(movies_path, credits_path):
+    """Read the TMDB movies and credits CSVs"""
+    movies = pd.read_csv(movies_path)
+    credits = pd.read_csv(credits_path)
+
+    print(f"Movies dataset: {movies.shape}")
+    print(f"Credits dataset: {credits.shape}")
+    return movies, credits
+
+
+def merge_tmdb(movies, credits):
+    """Merge movies with their credits and keep the COLUMNS used for tags"""
+    movies = movies.merge(credits, on='title')
+    print(f"Merged dataset: {movies.shape}")
+
+    # Select relevant columns and handle missing values
+    movies = movies[COLUMNS].copy()
+    movies['overview'] = movies['overview'].fillna("")
+    movies.dropna(inplace=True)
+    print(f"Final dataset: {movies.shape}")
+
+    return movies
+
+
+def load_tmdb(movies_path, credits_path, timings=None):
+    """Read and merge the TMDB movies and credits CSVs
+
+    If a `timings` dict is given, the seconds spent reading and merging are
+    stored in it under 'load' and 'merge'.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    movies, credits = read_tmdb(movies_path, credits_path)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    movies = merge_tmdb(movies, credits)
+    timings['merge'] = time.perf_counter() - start
+    return movies
+
+
+def parse_list(cell):
+    """Parse a JSON-in-CSV list cell, falling back to Python literal syntax"""
+    try:
+        return _loads(cell)
+    except (TypeError, ValueError):
+        try:
+            return ast.literal_eval(cell)
+        except (TypeError, ValueError, SyntaxError):
+            return []
+
+
+def parse_names(cell, limit=None):
+    """Names from a list of {'name': ...} objects, optionally only the first few"""
+    try:
+        return [item['name'] for item in parse_list(cell)[:limit]]
+    except (TypeError, KeyError):
+        return []
+
+
+def parse_director(cell):
+    """The first crew member whose job is Director, as a one-item list"""
+    try:
+        for item in parse_list(cell):
+            if item.get('job') == 'Director':
+                return [item['name']]
+    except (AttributeError, TypeError, KeyError):
+        pass
+    return []
+
+
+def parse_chunk(chunk, cast_limit=None):
+    """Parse every list column of a chunk of rows
+
+    Returns the parsed columns and the seconds spent on each column.
+    """
+    parsers = {
+        'genres': parse_names,
+        'keywords': parse_names,
+        'cast': lambda cell: parse_names(cell, cast_limit),
+        'crew': parse_director,
+    }
+
+    parsed, timings = {}, {}
+    for column, cells in chunk.items():
+        start = time.perf_counter()
+        parsed[column] = [parsers[column](cell) for cell in cells]
+        timings[column] = time.perf_counter() - start
+    return parsed, timings
+
+
+def parse_columns(movies, workers=INGEST_WORKERS, cast_limit=None, chunk_rows=CHUNK_ROWS):
+    """Replace the JSON list columns of a TMDB frame with parsed lists
+
+    Rows are split into chunks that are parsed in a process pool. Per-column
+    timings (summed over all workers) are printed and returned with the
+    frame.
+    """
+    movies = movies.copy()
+    columns = {column: movies[column].tolist() for column in LIST_COLUMNS}
+    chunks = [
+        {column: cells[start:start + chunk_rows] for column, cells in columns.items()}
+        for start in range(0, len(movies), chunk_rows)
+    ]
+
+    workers = max(min(workers, len(chunks)), 1)
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_chunk, chunks, [cast_limit] * len(chunks)))
+    else:
+        results = [parse_chunk(chunk, cast_limit) for chunk in chunks]
+    elapsed = time.perf_counter() - start
+
+    timings = {}
+    for column in LIST_COLUMNS:
+        movies[column] = [value for parsed, _ in results for value in parsed[column]]
+        timings[column] = sum(chunk_timings[column] for _, chunk_timings in results)
+        print(f"Parsed {column} in {timings[column]:.2f}s")
+    print(f"Parsed {len(movies)} rows in {elapsed:.2f}s with {workers} worker(s)")
+
+    return movies, timings
+
+
+def build_tags(movies):
+    """Combine parsed columns into one space-separated tags string per movie
+
+    Multi-word genres and keywords are joined into single tokens. Returns a
+    frame with the CATALOG_COLUMNS and tags, indexed by row position; the
+    genres column keeps the original names joined by GENRE_SEPARATOR.
+    """
+    def squash(values):
+        return [value.replace(" ", "") for value in values]
+
+    overview = movies['overview'].apply(lambda x: squash(x.split()))
+    genres = movies['genres'].apply(squash)
+    keywords = movies['keywords'].apply(squash)
+    tags = overview + genres + keywords + movies['cast'] + movies['crew']
+
+    movies_df = movies[CATALOG_COLUMNS].reset_index(drop=True)
+    movies_df['genres'] = movies['genres'].apply(GENRE_SEPARATOR.join).to_numpy()
+    movies_df['tags'] = tags.apply(' '.join).to_numpy()
+    return movies_df
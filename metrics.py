@@ -0,0 +1,146 @@
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+
+# Directory shared by all gunicorn workers; when set, /metrics aggregates every worker
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+# Seconds between resident memory samples taken while serving requests
+MEMORY_SAMPLE_INTERVAL = 5.0
+
+REQUESTS = Counter(
+    'recommender_requests_total', 'HTTP requests served',
+    ['route', 'method', 'status'],
+)
+REQUEST_LATENCY = Histogram(
+    'recommender_request_duration_seconds', 'Time to build an HTTP response',
+    ['route'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+CACHE_LOOKUPS = Counter(
+    'recommender_cache_lookups_total', 'Response cache lookups',
+    ['cache', 'result'],
+)
+BUILD_STAGE = Gauge(
+    'recommender_build_stage_seconds', 'Duration of each stage of the last model build or load',
+    ['stage'], multiprocess_mode='mostrecent',
+)
+ARTIFACT_BYTES = Gauge(
+    'recommender_artifact_bytes', 'Size on disk of the artifact generation being served',
+    multiprocess_mode='mostrecent',
+)
+MOVIES = Gauge(
+    'recommender_movies', 'Movies in the catalog being served',
+    multiprocess_mode='mostrecent',
+)
+RESIDENT_MEMORY = Gauge(
+    'recommender_resident_memory_bytes', 'Resident set size of each server process',
+    multiprocess_mode='liveall',
+)
+
+_last_memory_sample = 0.0
+
+# Last values of the model gauges, so a forked worker can publish them under its own pid
+_stages = {}
+_model = {}
+
+
+def resident_memory():
+    """Current resident set size in bytes, or the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def sample_memory(force=False):
+    """Update the resident memory gauge at most every MEMORY_SAMPLE_INTERVAL seconds"""
+    global _last_memory_sample
+    now = time.monotonic()
+    if force or now - _last_memory_sample >= MEMORY_SAMPLE_INTERVAL:
+        _last_memory_sample = now
+        RESIDENT_MEMORY.set(resident_memory())
+
+
+def observe_request(route, method, status, seconds):
+    """Count a request and record its latency"""
+    REQUESTS.labels(route, method, str(status)).inc()
+    REQUEST_LATENCY.labels(route).observe(seconds)
+    sample_memory()
+
+
+def record_cache_lookup(cache, hit):
+    """Count a response cache hit or miss"""
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_stage(stage, seconds):
+    """Record how long a build stage took"""
+    _stages[stage] = seconds
+    BUILD_STAGE.labels(stage).set(seconds)
+
+
+@contextmanager
+def build_stage(stage):
+    """Time the enclosed block as a build stage"""
+    start = time.perf_counter()
+    yield
+    record_stage(stage, time.perf_counter() - start)
+
+
+def record_model(movies, artifact_bytes=None):
+    """Record the size of the model being served"""
+    _model['movies'] = movies
+    _model['artifact_bytes'] = artifact_bytes
+    MOVIES.set(movies)
+    if artifact_bytes is not None:
+        ARTIFACT_BYTES.set(artifact_bytes)
+    sample_memory(force=True)
+
+
+def republish():
+    """Set the model gauges again from their last recorded values
+
+    In multiprocess mode values are written to files named after the
+    process, so a worker forked after the master loaded the model must
+    publish the master's values itself.
+    """
+    for stage, seconds in _stages.items():
+        BUILD_STAGE.labels(stage).set(seconds)
+    if _model:
+        record_model(_model['movies'], _model['artifact_bytes'])
+
+
+def render_metrics():
+    """Metrics in the Prometheus text format, with its content type
+
+    In multiprocess mode the values written by every worker are merged.
+    """
+    sample_memory(force=True)
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def clear_multiproc_dir():
+    """Remove metric files left behind by a previous server run"""
+    if MULTIPROC_DIR and os.path.isdir(MULTIPROC_DIR):
+        for entry in os.scandir(MULTIPROC_DIR):
+            if entry.name.endswith('.db'):
+                os.remove(entry.path)
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of a worker that exited"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
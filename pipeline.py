@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from artifact import file_checksum
+from engine import (
+    ENGINE, ENGINES, LSH_BITS, LSH_PROBES, LSH_SEED, LSH_TABLES, NEIGHBORS_K, SVD_DIMENSIONS, SVD_SEED,
+    VECTOR_PRECISION, build_engine,
+)
+from ingest import INGEST_WORKERS, build_tags, merge_tmdb, parse_columns, read_tmdb, tmdb_paths
+
+# Bump whenever a stage changes what it produces, so older cache entries are ignored
+PIPELINE_VERSION = 2
+
+# Directory holding cached stage outputs; an empty value disables caching
+PIPELINE_CACHE_DIR = os.environ.get('PIPELINE_CACHE_DIR', '.pipeline_cache')
+
+# Stages in the order they run, each consuming the output of the one before
+STAGES = ['load', 'merge', 'parse', 'tag', 'vectorize', 'index']
+
+# Stages whose outputs are returned and therefore kept in memory during a run
+RESULT_STAGES = {'tag', 'vectorize', 'index'}
+
+# Returned by read_cache() when a stage has no usable cache entry; None is a valid output
+_MISSING = object()
+
+
+def stage_key(stage, parent, params):
+    """Cache key of a stage from its parent stage's key and its own parameters"""
+    description = json.dumps(
+        {'version': PIPELINE_VERSION, 'stage': stage, 'parent': parent, 'params': params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def cache_path(stage, key, cache_dir):
+    """File caching a stage's output, or None when caching is disabled"""
+    return os.path.join(cache_dir, f'{stage}-{key[:32]}.pkl') if cache_dir else None
+
+
+def read_cache(path):
+    """Cached stage output, or _MISSING if there is no readable entry"""
+    if path is None or not os.path.exists(path):
+        return _MISSING
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        print(f"Ignoring unreadable cache entry {path}: {e}")
+        return _MISSING
+
+
+def write_cache(path, output):
+    """Pickle a stage output atomically, so readers never see a partial entry"""
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f'{path}.{os.getpid()}.tmp'
+    with open(staging, 'wb') as f:
+        pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(staging, path)
+
+
+def vectorize(movies_df, max_features, stop_words):
+    """Fit a CountVectorizer on the tags; returns the vectorizer and vectors"""
+    cv = CountVectorizer(max_features=max_features, stop_words=stop_words)
+    vectors = cv.fit_transform(movies_df['tags'])
+    return cv, vectors
+
+
+def text_query(cv, text, max_words=3):
+    """Normalized sparse query row for free text, tokenized like the tags
+
+    Tags squash multi-word genres and keywords into single tokens, so runs
+    of up to max_words adjacent words are added squashed as well; runs the
+    vocabulary does not contain are dropped by the vectorizer.
+    """
+    words = text.split()
+    runs = [''.join(words[i:i + n]) for n in range(2, max_words + 1) for i in range(len(words) - n + 1)]
+    return normalize(cv.transform([' '.join([text, *runs])]).astype(np.float32))
+
+
+def engine_params(mode):
+    """Environment settings an engine of this mode is built with"""
+    return {
+        'topk': {'neighbors_k': NEIGHBORS_K},
+        'lsh': {'tables': LSH_TABLES, 'bits': LSH_BITS, 'probes': LSH_PROBES, 'seed': LSH_SEED},
+        'svd': {'dimensions': SVD_DIMENSIONS, 'seed': SVD_SEED},
+    }.get(mode, {})
+
+
+def run_pipeline(movies_path=None, credits_path=None, cast_limit=None, max_features=5000,
+                 stop_words='english', engine=ENGINE, precision=VECTOR_PRECISION, workers=INGEST_WORKERS,
+                 cache_dir=PIPELINE_CACHE_DIR, on_stage=None):
+    """Build the catalog, vectorizer and similarity engine from the TMDB CSVs
+
+    Each stage's output is cached in cache_dir under a hash of the CSV
+    contents and of the parameters of that stage and every stage before it.
+    Stages are resolved from the end, so a stage only runs, or is read from
+    the cache, when a later stage needs it: changing max_features reruns
+    vectorize and index and reads the tagged catalog from the cache, without
+    touching the CSVs. `on_stage(stage, seconds)` is called after every
+    stage that ran or was read. Returns (movies_df, cv, engine, timings).
+    """
+    if movies_path is None or credits_path is None:
+        movies_path, credits_path = tmdb_paths()
+
+    # The load key hashes the file contents, so a data refresh invalidates every stage
+    params = {
+        'load': {'movies': file_checksum(movies_path), 'credits': file_checksum(credits_path)},
+        'merge': {},
+        'parse': {'cast_limit': cast_limit},
+        'tag': {},
+        'vectorize': {'max_features': max_features, 'stop_words': stop_words},
+        'index': {'engine': engine, 'precision': precision, **engine_params(engine)},
+    }
+    compute = {
+        'load': lambda _: read_tmdb(movies_path, credits_path),
+        'merge': lambda frames: merge_tmdb(*frames),
+        'parse': lambda movies: parse_columns(movies, workers, cast_limit)[0],
+        'tag': build_tags,
+        'vectorize': lambda movies_df: vectorize(movies_df, max_features, stop_words),
+        'index': lambda vectorized: build_engine(vectorized[1], engine, precision),
+    }
+
+    keys, parent = {}, None
+    for name in STAGES:
+        keys[name] = parent = stage_key(name, parent, params[name])
+
+    timings, kept = {}, {}
+
+    def resolve(name):
+        if name in kept:
+            return kept[name]
+
+        path = cache_path(name, keys[name], cache_dir)
+        start = time.perf_counter()
+        output = read_cache(path)
+        cached = output is not _MISSING
+        if not cached:
+            position = STAGES.index(name)
+            parent_output = resolve(STAGES[position - 1]) if position else None
+            start = time.perf_counter()
+            output = compute[name](parent_output)
+            write_cache(path, output)
+
+        timings[name] = time.perf_counter() - start
+        print(f"Stage {name} {'read from cache' if cached else 'finished'} in {timings[name]:.2f}s")
+        if on_stage is not None:
+            on_stage(name, timings[name])
+        if name in RESULT_STAGES:
+            kept[name] = output
+        return output
+
+    similarity_engine = resolve('index')
+    cv, _ = resolve('vectorize')
+    movies_df = resolve('tag')
+    return movies_df, cv, similarity_engine, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the processing pipeline, reusing cached stages")
+    parser.add_argument('--data-dir', help="directory with the TMDB CSVs (default: TMDB_DATA_DIR)")
+    parser.add_argument('--cast-limit', type=int, help="keep only the first N cast members")
+    parser.add_argument('--max-features', type=int, default=5000)
+    parser.add_argument('--engine', default=ENGINE, choices=list(ENGINES))
+    parser.add_argument('--precision', default=VECTOR_PRECISION, choices=['float64', 'float32', 'int8'])
+    parser.add_argument('--cache-dir', default=PIPELINE_CACHE_DIR)
+    parser.add_argument('--clear-cache', action='store_true', help="delete every cached stage first")
+    args = parser.parse_args()
+
+    if args.clear_cache and args.cache_dir and os.path.isdir(args.cache_dir):
+        shutil.rmtree(args.cache_dir)
+        print(f"Cleared {args.cache_dir}")
+
+    paths = tmdb_paths(args.data_dir) if args.data_dir else (None, None)
+    movies_df, _, _, timings = run_pipeline(
+        *paths, cast_limit=args.cast_limit, max_features=args.max_features,
+        engine=args.engine, precision=args.precision, cache_dir=args.cache_dir,
+    )
+    print(f"Built {len(movies_df)} movies in {sum(timings.values()):.2f}s")
+
+
+if __name__ == '__main__':
+    main()
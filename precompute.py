@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from artifact import ARTIFACT_DIR, PRECOMPUTE_JOB_PREFIX, current_generation, load_artifact, load_model, save_model
+from engine import NEIGHBORS_K, NeighborIndexEngine, block_rows, exact_neighbors, vectors_from_arrays
+
+# Worker processes computing neighbor blocks
+PRECOMPUTE_WORKERS = int(os.environ.get('PRECOMPUTE_WORKERS', os.cpu_count() or 1))
+
+# Blocks queued per worker, so uneven blocks still keep every core busy
+BLOCKS_PER_WORKER = 4
+
+JOB_FILE = 'job.json'
+
+# Set in each worker process by init_worker()
+_worker = {}
+
+
+def job_dir(generation, k, root=ARTIFACT_DIR):
+    """Hidden directory holding a precompute job's partial results"""
+    return os.path.join(root, f'{PRECOMPUTE_JOB_PREFIX}{generation}-k{k}')
+
+
+def open_job(path, generation, n, k, rows_per_block, score_dtype):
+    """Create a job directory, or reopen an interrupted one with its original settings
+
+    The neighbor arrays are .npy files memory-mapped by every worker; each
+    finished block leaves a marker file so a restarted job skips it.
+    """
+    job_path = os.path.join(path, JOB_FILE)
+    if os.path.exists(job_path):
+        with open(job_path) as f:
+            job = json.load(f)
+        print(f"Resuming precompute job in {path}")
+        return job
+
+    staging = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.join(staging, 'done'))
+    k = max(min(k, n - 1), 0)
+    np.lib.format.open_memmap(os.path.join(staging, 'neighbor_ids.npy'), mode='w+', dtype=np.int32, shape=(n, k)).flush()
+    np.lib.format.open_memmap(os.path.join(staging, 'neighbor_scores.npy'), mode='w+', dtype=score_dtype, shape=(n, k)).flush()
+    job = {'generation': generation, 'movies': n, 'k': k, 'block_rows': rows_per_block}
+    with open(os.path.join(staging, JOB_FILE), 'w') as f:
+        json.dump(job, f, indent=2)
+    os.rename(staging, path)
+    return job
+
+
+def block_marker(path, block):
+    """File marking a block as written"""
+    return os.path.join(path, 'done', f'block-{block:06d}')
+
+
+def init_worker(root, generation, path):
+    """Memory-map the artifact vectors and the job's output arrays once per worker"""
+    _, arrays = load_artifact(generation, root)
+    _worker['vectors'] = vectors_from_arrays(arrays)
+    _worker['scales'] = arrays.get('vectors_scales')
+    _worker['ids'] = np.load(os.path.join(path, 'neighbor_ids.npy'), mmap_mode='r+')
+    _worker['scores'] = np.load(os.path.join(path, 'neighbor_scores.npy'), mmap_mode='r+')
+    _worker['path'] = path
+
+
+def compute_block(block, start, stop, k):
+    """Write the top-k neighbors of rows [start, stop) and mark the block done"""
+    ids, scores = exact_neighbors(_worker['vectors'], np.arange(start, stop), k, _worker['scales'])
+    _worker['ids'][start:stop] = ids
+    _worker['scores'][start:stop] = scores
+    _worker['ids'].flush()
+    _worker['scores'].flush()
+    open(block_marker(_worker['path'], block), 'w').close()
+    return block
+
+
+def precompute_neighbors(generation=None, k=NEIGHBORS_K, workers=PRECOMPUTE_WORKERS, rows_per_block=None,
+                         root=ARTIFACT_DIR):
+    """Precompute every movie's top-k neighbors and save them as a new topk generation
+
+    Rows are split into blocks scored by a pool of worker processes that
+    memory-map the artifact vectors, so memory per worker is bounded by the
+    block size rather than the catalog squared. Each block is written to
+    memory-mapped arrays in a job directory under the artifact root as soon
+    as it is done; rerunning after an interruption only computes the
+    missing blocks. Returns the new generation id.
+    """
+    generation = generation or current_generation(root)
+    manifest, movies_df, vocabulary, engine = load_model(generation, root)
+    n = engine.vectors.shape[0]
+    if rows_per_block is None:
+        rows_per_block = min(block_rows(n), max(1, -(-n // (workers * BLOCKS_PER_WORKER))))
+
+    path = job_dir(manifest['generation'], k, root)
+    score_dtype = np.float64 if engine.vectors.dtype == np.float64 else np.float32
+    job = open_job(path, manifest['generation'], n, k, rows_per_block, score_dtype)
+
+    blocks = [
+        (block, start, min(start + job['block_rows'], n))
+        for block, start in enumerate(range(0, n, job['block_rows']))
+    ]
+    pending = [block for block in blocks if not os.path.exists(block_marker(path, block[0]))]
+    print(f"Computing {len(pending)} of {len(blocks)} blocks of {job['block_rows']} rows "
+          f"with {workers} workers (k={job['k']})")
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(root, manifest['generation'], path)) as executor:
+        futures = [executor.submit(compute_block, *block, job['k']) for block in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            if done % max(1, len(futures) // 20) == 0 or done == len(futures):
+                print(f"{done}/{len(futures)} blocks done in {time.perf_counter() - start_time:.1f}s")
+
+    neighbor_ids = np.load(os.path.join(path, 'neighbor_ids.npy'), mmap_mode='r')
+    neighbor_scores = np.load(os.path.join(path, 'neighbor_scores.npy'), mmap_mode='r')
+    topk = NeighborIndexEngine(engine.vectors, neighbor_ids, neighbor_scores, normalized=True,
+                               precision=engine.precision, scales=engine.scales)
+    new_generation = save_model(movies_df, vocabulary, topk, root=root, parent=manifest['generation'],
+                                cast_limit=manifest.get('cast_limit'))
+    shutil.rmtree(path)
+    print(f"Saved neighbor index as generation {new_generation}")
+    return new_generation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-K neighbors of every movie in an artifact generation")
+    parser.add_argument('--generation', help="generation to index (default: current)")
+    parser.add_argument('-k', type=int, default=NEIGHBORS_K, help="neighbors kept per movie")
+    parser.add_argument('--workers', type=int, default=PRECOMPUTE_WORKERS)
+    parser.add_argument('--block-rows', type=int, help="rows per block (default: sized from BLOCK_CELLS and workers)")
+    parser.add_argument('--artifact-dir', default=ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    precompute_neighbors(args.generation, args.k, args.workers, args.block_rows, args.artifact_dir)
+    print(f"Precompute finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
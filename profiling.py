@@ -0,0 +1,151 @@
+import cProfile
+import gc
+import heapq
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+
+# Fraction of requests profiled without being asked to; 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+# Secret for the X-Profile-Signature header that profiles one request; unset disables it
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET')
+
+# Number of slowest request profiles kept per process
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+
+# Seconds a profile signature stays valid
+SIGNATURE_MAX_AGE = 300
+
+# Profiling costs nothing beyond this check when neither trigger is configured
+ENABLED = PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_SECRET)
+
+
+def sign(method, full_path, timestamp, secret=PROFILE_SECRET):
+    """X-Profile-Signature value asking to profile one request
+
+    full_path is the path with its query string, as in Flask's
+    `request.full_path` ('/api/search?q=alien'; a bare path ends in '?'), so
+    a signature cannot be replayed for other parameters or methods.
+    """
+    message = f'{timestamp}:{method.upper()}:{full_path}'
+    digest = hmac.new(secret.encode(), message.encode(), 'sha256').hexdigest()
+    return f'{timestamp}:{digest}'
+
+
+def signature_valid(signature, method, full_path, secret=PROFILE_SECRET):
+    """True if a signature was made with the secret for this request and is recent"""
+    try:
+        timestamp, _ = signature.split(':', 1)
+        age = time.time() - int(timestamp)
+    except ValueError:
+        return False
+    return 0 <= age <= SIGNATURE_MAX_AGE and hmac.compare_digest(signature, sign(method, full_path, timestamp, secret))
+
+
+class ProfileStore:
+    """The slowest request profiles seen, evicting the fastest once `keep` are stored"""
+
+    def __init__(self, keep=PROFILE_KEEP):
+        self.keep = keep
+        self.heap = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add(self, profiler, method, path, seconds, gc_seconds):
+        """Store a finished profile unless it is faster than every stored one"""
+        entry = {
+            'id': next(self.ids),
+            'method': method,
+            'path': path,
+            'seconds': seconds,
+            'gc_seconds': gc_seconds,
+            'captured_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }
+        with self.lock:
+            item = (seconds, entry['id'], entry, profiler)
+            if len(self.heap) < self.keep:
+                heapq.heappush(self.heap, item)
+            elif self.keep > 0 and seconds > self.heap[0][0]:
+                heapq.heapreplace(self.heap, item)
+
+    def entries(self):
+        """Metadata of the stored profiles, slowest first"""
+        with self.lock:
+            return [entry for _, _, entry, _ in sorted(self.heap, key=lambda item: item[0], reverse=True)]
+
+    def profiler(self, profile_id):
+        """Profiler of a stored profile, or None if it was evicted"""
+        with self.lock:
+            for _, entry_id, _, profiler in self.heap:
+                if entry_id == profile_id:
+                    return profiler
+        return None
+
+
+profiles = ProfileStore()
+
+# Only one request per process is profiled at a time, since profilers would see each other's calls
+_active = threading.Lock()
+_gc_state = {'start': None, 'seconds': 0.0}
+
+
+def _time_gc(phase, info):
+    """gc callback adding the duration of every collection to the active profile"""
+    if phase == 'start':
+        _gc_state['start'] = time.perf_counter()
+    elif _gc_state['start'] is not None:
+        _gc_state['seconds'] += time.perf_counter() - _gc_state['start']
+        _gc_state['start'] = None
+
+
+def start_profile(method, full_path, signature=None):
+    """Start profiling a request if it is sampled or carries a valid signature
+
+    Returns the running profiler, or None when the request is not profiled.
+    """
+    if not ENABLED:
+        return None
+    signed = signature is not None and bool(PROFILE_SECRET) and signature_valid(signature, method, full_path)
+    if not signed and not random.random() < PROFILE_SAMPLE_RATE:
+        return None
+    if not _active.acquire(blocking=False):
+        return None
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is already running in this process
+        _active.release()
+        return None
+    _gc_state['seconds'] = 0.0
+    gc.callbacks.append(_time_gc)
+    return profiler
+
+
+def finish_profile(profiler, method, path, seconds):
+    """Stop a profiler started by start_profile() and keep it if it is among the slowest"""
+    profiler.disable()
+    gc.callbacks.remove(_time_gc)
+    gc_seconds = _gc_state['seconds']
+    _active.release()
+    profiles.add(profiler, method, path, seconds, gc_seconds)
+
+
+def profile_bytes(profiler):
+    """Profile in the pstats file format, loadable with pstats or snakeviz"""
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+def profile_text(profiler, limit=40):
+    """Human-readable report of the most expensive calls by cumulative time"""
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,325 @@
+import hashlib
+
+import numpy as np
+
+# Results returned per search and candidates examined per query
+SEARCH_LIMIT = 10
+MAX_CANDIDATES = 2000
+FUZZY_CANDIDATES = 50
+MAX_EDIT_DISTANCE = 2
+
+EMPTY = np.empty(0, dtype=np.int32)
+
+
+def normalize_title(title):
+    """Lowercase a title and collapse its whitespace for lookups"""
+    return ' '.join(str(title).lower().split())
+
+
+def is_movie_reference(value):
+    """True for a title or a TMDB id; JSON booleans are not ids even though bool is an int"""
+    return isinstance(value, str) or (isinstance(value, int) and not isinstance(value, bool))
+
+
+def key_hash(key):
+    """63-bit hash of a string or integer key, the same in every process"""
+    digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') >> 1
+
+
+class StringTable:
+    """Strings packed into one UTF-8 byte array plus start offsets
+
+    Strings are decoded one at a time when read, so a table memory-mapped
+    from an artifact costs no private memory per process.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Pack a sequence of strings"""
+        encoded = [str(string).encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        start, stop = self.offsets[position], self.offsets[position + 1]
+        return self.blob[start:stop].tobytes().decode('utf-8')
+
+    def take(self, positions):
+        """Strings at an array of positions, as (nested) lists of the same shape"""
+        positions = np.asarray(positions)
+        strings = np.empty(positions.shape, dtype=object)
+        for index, position in np.ndenumerate(positions):
+            strings[index] = self[position]
+        return strings.tolist()
+
+    def to_arrays(self, prefix):
+        """Arrays storing the table under a name prefix"""
+        return {f'{prefix}_blob': self.blob, f'{prefix}_offsets': self.offsets}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        """Table stored by to_arrays(), reading the (memory-mapped) arrays in place"""
+        return cls(arrays[f'{prefix}_blob'], arrays[f'{prefix}_offsets'])
+
+
+class HashIndex:
+    """Open-addressing hash table from keys to groups of row numbers, stored as flat arrays
+
+    `slots` points at key numbers, `hashes` holds each key's key_hash() and
+    the rows of key i are values[starts[i]:starts[i + 1]]. Keys themselves
+    are not stored; callers that cannot tolerate a hash collision check the
+    rows they get back. A lookup probes a few slots whatever the size.
+    """
+
+    def __init__(self, groups=None, slots=None, hashes=None, starts=None, values=None):
+        if slots is None:
+            hashes = np.array([key_hash(key) for key in groups], dtype=np.int64)
+            starts = np.zeros(len(groups) + 1, dtype=np.int64)
+            np.cumsum([len(rows) for rows in groups.values()], out=starts[1:])
+            values = np.fromiter((row for rows in groups.values() for row in rows), dtype=np.int32, count=int(starts[-1]))
+
+            # At most half the slots are used, so probe sequences stay short
+            slots = np.full(1 << max(1, 2 * len(groups) - 1).bit_length(), -1, dtype=np.int32)
+            mask = len(slots) - 1
+            for key, value in enumerate(hashes.tolist()):
+                slot = value & mask
+                while slots[slot] >= 0:
+                    slot = (slot + 1) & mask
+                slots[slot] = key
+        self.slots = slots
+        self.hashes = hashes
+        self.starts = starts
+        self.values = values
+
+    def get(self, key):
+        """Rows stored under a key, or an empty array"""
+        value = key_hash(key)
+        mask = len(self.slots) - 1
+        slot = value & mask
+        while True:
+            found = int(self.slots[slot])
+            if found < 0:
+                return EMPTY
+            if self.hashes[found] == value:
+                return self.values[self.starts[found]:self.starts[found + 1]]
+            slot = (slot + 1) & mask
+
+    def to_arrays(self, prefix):
+        """Arrays storing the index under a name prefix"""
+        return {f'{prefix}_{name}': getattr(self, name) for name in ('slots', 'hashes', 'starts', 'values')}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        """Index stored by to_arrays(), reading the (memory-mapped) arrays in place"""
+        return cls(**{name: arrays[f'{prefix}_{name}'] for name in ('slots', 'hashes', 'starts', 'values')})
+
+
+class TitleIndex:
+    """Hash index from titles and TMDB ids to row positions
+
+    Built once per artifact generation and stored with it as arrays, so
+    loading it costs nothing and every worker shares the same pages.
+    """
+
+    def __init__(self, titles, ids, exact=None, normalized=None, by_id=None):
+        self.titles = titles if isinstance(titles, StringTable) else StringTable.from_strings(titles)
+        self.ids = np.asarray(ids)
+        if exact is None:
+            exact, normalized, by_id = {}, {}, {}
+            for position, (title, movie_id) in enumerate(zip(titles, self.ids.tolist())):
+                exact.setdefault(title, []).append(position)
+                normalized.setdefault(normalize_title(title), []).append(position)
+                by_id.setdefault(int(movie_id), []).append(position)
+            exact, normalized, by_id = HashIndex(exact), HashIndex(normalized), HashIndex(by_id)
+        self.exact = exact
+        self.normalized = normalized
+        self.by_id = by_id
+
+    def to_arrays(self):
+        """Arrays storing the index; titles and ids are stored with the catalog"""
+        return {
+            **self.exact.to_arrays('title_exact'),
+            **self.normalized.to_arrays('title_normalized'),
+            **self.by_id.to_arrays('title_ids'),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, titles):
+        """Index stored by to_arrays(), over the catalog's titles"""
+        return cls(titles, arrays['ids'], HashIndex.from_arrays(arrays, 'title_exact'),
+                   HashIndex.from_arrays(arrays, 'title_normalized'), HashIndex.from_arrays(arrays, 'title_ids'))
+
+    def candidates(self, title):
+        """All row positions matching a title, exact spelling first"""
+        if not isinstance(title, str):
+            return []
+        matches = [position for position in self.exact.get(title).tolist() if self.titles[position] == title]
+        if matches:
+            return matches
+        key = normalize_title(title)
+        return [position for position in self.normalized.get(key).tolist() if normalize_title(self.titles[position]) == key]
+
+    def lookup(self, title=None, movie_id=None):
+        """Row position for a TMDB id or a title, or None if nothing matches
+
+        An id always takes precedence. A title shared by several movies
+        resolves to the first of them in the catalog; pass the id to pick a
+        specific one.
+        """
+        if movie_id is not None:
+            matches = [position for position in self.by_id.get(int(movie_id)).tolist()
+                       if self.ids[position] == int(movie_id)]
+            return matches[0] if matches else None
+
+        matches = self.candidates(title)
+        return matches[0] if matches else None
+
+
+def ngrams(text, n=3):
+    """Set of character n-grams in a string"""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def substring_distance(query, text, max_distance):
+    """Fewest edits turning the query into any substring of text, capped at max_distance + 1
+
+    One Levenshtein pass where the match may start and end anywhere in
+    text: the first row costs nothing and the answer is the smallest
+    value of the last row.
+    """
+    previous = [0] * (len(text) + 1)
+    for i, char_query in enumerate(query, 1):
+        current = [i]
+        for j, char_text in enumerate(text, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_query != char_text),
+            ))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(min(previous), max_distance + 1)
+
+
+class SearchIndex:
+    """Character n-gram inverted index over movie titles
+
+    Titles are numbered by popularity rank, so every posting list is already
+    ordered from most to least popular. A query only looks at the postings of
+    its own n-grams, never at the whole catalog. Like TitleIndex, it is
+    stored with the artifact generation and memory-mapped when loaded.
+    """
+
+    def __init__(self, titles, popularity=None, order=None, names=None, exact=None, postings=None):
+        self.titles = titles if isinstance(titles, StringTable) else StringTable.from_strings(titles)
+        if order is None:
+            if popularity is None:
+                popularity = np.zeros(len(self.titles))
+
+            # rank -> row position, most popular first
+            order = np.argsort(-np.asarray(popularity, dtype=float), kind='stable').astype(np.int32)
+            normalized = [normalize_title(self.titles[position]) for position in order.tolist()]
+            exact, grams_ranks = {}, {}
+            for rank, name in enumerate(normalized):
+                exact.setdefault(name, []).append(rank)
+                padded = f' {name} '
+                # Trigrams for substring matches, plus word-start bigrams so
+                # single-character queries still have a posting list
+                grams = ngrams(padded) | {' ' + word[0] for word in name.split()}
+                for gram in grams:
+                    grams_ranks.setdefault(gram, []).append(rank)
+            names, exact, postings = StringTable.from_strings(normalized), HashIndex(exact), HashIndex(grams_ranks)
+        self.order = order
+        self.names = names
+        self.exact = exact
+        self.postings = postings
+
+    def to_arrays(self):
+        """Arrays storing the index; titles are stored with the catalog"""
+        return {
+            'search_order': self.order,
+            **self.names.to_arrays('search_names'),
+            **self.exact.to_arrays('search_exact'),
+            **self.postings.to_arrays('search_postings'),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, titles):
+        """Index stored by to_arrays(), over the catalog's titles"""
+        return cls(titles, order=arrays['search_order'], names=StringTable.from_arrays(arrays, 'search_names'),
+                   exact=HashIndex.from_arrays(arrays, 'search_exact'),
+                   postings=HashIndex.from_arrays(arrays, 'search_postings'))
+
+    def candidates(self, query):
+        """Ranks of titles that may contain the query, most popular first"""
+        if len(query) < 3:
+            # Short queries only match at the start of a word
+            return self.postings.get(' ' + query)
+
+        lists = sorted((self.postings.get(gram) for gram in ngrams(query)), key=len)
+        candidates = lists[0]
+        for ranks in lists[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, ranks, assume_unique=True)
+        return candidates
+
+    def fuzzy_candidates(self, query, max_distance, seen):
+        """(tier, rank) pairs for titles within max_distance edits of the query"""
+        lists = [ranks for ranks in (self.postings.get(gram) for gram in ngrams(f' {query} ')) if len(ranks)]
+        if not lists:
+            return []
+
+        # Titles sharing the most n-grams with the query are the likeliest typos
+        overlap = np.bincount(np.concatenate(lists), minlength=len(self.names))
+        size = min(FUZZY_CANDIDATES, len(overlap))
+        best = np.argpartition(-overlap, size - 1)[:size]
+
+        matches = []
+        for rank in best[overlap[best] > 0].tolist():
+            if rank in seen:
+                continue
+            distance = substring_distance(query, self.names[rank], max_distance)
+            if distance <= max_distance:
+                matches.append((4 + distance, rank))
+        return matches
+
+    def search(self, query, limit=SEARCH_LIMIT, fuzzy=0):
+        """Best matching titles for a query
+
+        Exact matches rank first, then title prefixes, word prefixes and other
+        substrings; ties go to the more popular title. With fuzzy set to an
+        edit distance, near misses fill up any remaining slots.
+        """
+        query = normalize_title(query)
+        if not query:
+            return []
+
+        matches = {rank: 0 for rank in self.exact.get(query).tolist() if self.names[rank] == query}
+        for rank in self.candidates(query)[:MAX_CANDIDATES].tolist():
+            name = self.names[rank]
+            if rank in matches or query not in name:
+                continue
+            if name.startswith(query):
+                matches[rank] = 1
+            elif f' {query}' in name:
+                matches[rank] = 2
+            else:
+                matches[rank] = 3
+
+        results = sorted((tier, rank) for rank, tier in matches.items())
+        fuzzy = min(fuzzy, MAX_EDIT_DISTANCE)
+        if fuzzy > 0 and len(results) < limit and len(query) >= 3:
+            results += sorted(self.fuzzy_candidates(query, fuzzy, matches))
+
+        return [self.titles[int(self.order[rank])] for _, rank in results[:limit]]
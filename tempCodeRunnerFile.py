@@ -1,4 +1,4 @@
-director(obj):
-#     l=[]
-#     for i in ast.literal_eval(obj):
+director(obj):
+#     l=[]
+#     for i in ast.literal_eval(obj):
 #         if i['job']==''
\ No newline at end of file
@@ -0,0 +1,76 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from artifact import ARTIFACT_DIR, load_model, save_model
+from ingest import CATALOG_COLUMNS, build_tags, load_tmdb, parse_columns
+
+
+def update_catalog(movies, root=ARTIFACT_DIR):
+    """Apply new or changed movies to the current artifact generation
+
+    `movies` is a merged TMDB frame as returned by load_tmdb(). A movie whose
+    id is already in the catalog replaces it in place; other movies are
+    appended. Tags are vectorized against the existing vocabulary, so words
+    it does not contain are ignored until the next full rebuild. Cast lists
+    are cut to the build's cast_limit, so changed movies get the same tags a
+    full rebuild would give them. Writes a new generation, makes it current
+    and returns its id.
+    """
+    manifest, catalog, vocabulary, engine = load_model(root=root)
+
+    movies, _ = parse_columns(movies, cast_limit=manifest.get('cast_limit'))
+    changes = build_tags(movies).drop_duplicates('id', keep='last').reset_index(drop=True)
+    cv = CountVectorizer(vocabulary=vocabulary)
+    delta = normalize(cv.transform(changes['tags']).astype(np.float32))
+
+    # Changed movies keep their row position, new movies are appended
+    n_old = len(catalog)
+    positions = {}
+    for position, movie_id in enumerate(catalog['id'].tolist()):
+        positions.setdefault(movie_id, position)
+
+    changed = []
+    n = n_old
+    for movie_id in changes['id'].tolist():
+        if movie_id not in positions:
+            positions[movie_id] = n
+            n += 1
+        changed.append(positions[movie_id])
+    changed = np.array(changed, dtype=np.intp)
+
+    # Row i of the updated catalog is row source[i] of the old rows followed by the changes
+    source = np.arange(n)
+    source[changed] = n_old + np.arange(len(changes))
+    vectors = sparse.vstack([engine.float_vectors(), delta], format='csr')[source]
+    catalog = pd.concat([catalog, changes[CATALOG_COLUMNS]], ignore_index=True)
+    catalog = catalog.iloc[source].reset_index(drop=True)
+
+    updated = engine.update(vectors, changed)
+    generation = save_model(catalog, vocabulary, updated, root=root, parent=manifest['generation'],
+                            cast_limit=manifest.get('cast_limit'))
+
+    added = int((changed >= n_old).sum())
+    print(f"Updated {len(changed) - added} and added {added} movies in generation {generation}")
+    return generation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply new or changed TMDB movies to the current model artifact")
+    parser.add_argument('movies_csv', help="CSV with the same columns as tmdb_5000_movies.csv")
+    parser.add_argument('credits_csv', help="CSV with the same columns as tmdb_5000_credits.csv")
+    parser.add_argument('--artifact-dir', default=ARTIFACT_DIR, help="artifact directory to update")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    update_catalog(load_tmdb(args.movies_csv, args.credits_csv), args.artifact_dir)
+    print(f"Incremental update finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()